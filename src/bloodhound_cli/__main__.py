@@ -1,11 +1,20 @@
+import os
 import sys
 
-from bloodhound_cli.api.exceptions import ApiException
-from bloodhound_cli.cli import bloodhound_cli
-from bloodhound_cli.logger import log
+from bloodhound_cli import daemon
 
 
 def main():
+    if "BHCLI_NO_DAEMON" not in os.environ:
+        exit_code = daemon.forward(sys.argv[1:])
+        if exit_code is not None:
+            sys.exit(exit_code)
+
+    # imported only when running locally, as forwarding to the daemon needs none of it
+    from bloodhound_cli.api.exceptions import ApiException
+    from bloodhound_cli.cli import bloodhound_cli
+    from bloodhound_cli.logger import log
+
     try:
         sys.exit(bloodhound_cli())
     except ApiException as e:
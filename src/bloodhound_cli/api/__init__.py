@@ -1,18 +1,87 @@
 import base64
+import concurrent.futures
+import contextlib
 import datetime
+import gzip
 import hashlib
+import heapq
 import hmac
-import json
+import logging
+import socket
+import threading
 import time
 import urllib
+import weakref
 
 import requests
 
-from bloodhound_cli import cypher
+from bloodhound_cli import cypher, state
+from bloodhound_cli.constants import UploadStatus
 from bloodhound_cli.logger import log
+from . import codec
+from .domains import DomainDirectory
 from .exceptions import ApiException
 
 
+CONNECT_TIMEOUT = 3.1
+"""Timeout in seconds for establishing a connection to the API server."""
+
+TIMEOUTS = {
+    "metadata": 30,
+    "search": 60,
+    "cypher": 300,
+    "upload": 600,
+}
+"""Default timeouts in seconds for receiving a response, per class of operation."""
+
+COMPRESSION_THRESHOLD = 16384
+"""Minimum size in bytes of JSON request bodies that are sent compressed if compression is enabled."""
+
+PARTITION_SUFFIXES = "0123456789"
+"""Last characters of object IDs by which object listings are split into partitions fetched concurrently.
+
+SIDs end with the decimal RID, so objects with SIDs are spread evenly. Objects whose ID ends with another
+character (e.g. GUIDs ending with A-F) are fetched with the last partition.
+"""
+
+
+class _CancellableAdapter(requests.adapters.HTTPAdapter):
+    """HTTPAdapter keeping track of its connections, so that in-flight requests can be aborted."""
+
+    def __init__(self, *args, **kwargs):
+        self.connections = weakref.WeakSet()
+        super().__init__(*args, **kwargs)
+
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        connections = self.connections
+
+        def tracked(pool_cls):
+            class TrackedConnection(pool_cls.ConnectionCls):
+                def connect(self):
+                    super().connect()
+                    connections.add(self)
+            return type(pool_cls.__name__, (pool_cls,), {"ConnectionCls": TrackedConnection})
+
+        self.poolmanager.pool_classes_by_scheme = {
+            scheme: tracked(pool_cls)
+            for scheme, pool_cls in self.poolmanager.pool_classes_by_scheme.items()
+        }
+
+
+    def abort(self):
+        """Shut down the sockets of all connections, which aborts requests waiting for a response."""
+
+        for connection in list(self.connections):
+            sock = getattr(connection, "sock", None)
+            if sock is not None:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+
 class Api:
     """Api class for interacting with the BloodHound API server."""
 
@@ -24,36 +93,96 @@ class Api:
     """Value of the API token used for authentication."""
     _bearer = None
     """Bearer token as an alternative to the API token for authentication."""
+    _session = None
+    """Session of the requests library, keeping a pool of connections to the API server."""
+    timeouts = None
+    """Timeouts in seconds for receiving a response, per class of operation (metadata, search, cypher, upload)."""
+    _compress_requests = False
+    """Whether large JSON request bodies are sent gzip compressed."""
 
 
-    def __init__(self, url, token_id=None, token_key=None, bearer=None):
+    def __init__(self, url, token_id=None, token_key=None, bearer=None, pool_size=32, timeouts=None, compress_requests=False):
         """Create an instance of the Api class and set URL and authentication data.
 
         Either token_id + token_key or a bearer token needs to be set for authentication
         as long as the Api is not just used for initial login.
+        pool_size is the number of connections kept open for concurrent requests.
+        timeouts can override the default timeouts of some classes of operations.
+        With compress_requests, JSON request bodies larger than COMPRESSION_THRESHOLD are sent gzip compressed,
+        which requires a server accepting compressed requests.
+        Compressed responses are negotiated in any case (gzip, and zstd if the zstandard package is installed).
         """
 
         self._url = url
         self._token_id = token_id
         self._token_key = token_key
         self._bearer = bearer
+        self.timeouts = dict(TIMEOUTS, **(timeouts or {}))
+        self._compress_requests = compress_requests
+        self._cancelled = threading.Event()
+        self._directory = None
+        self._directory_lock = threading.Lock()
+        self._session = requests.Session()
+        self._adapter = _CancellableAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._session.mount("http://", self._adapter)
+        self._session.mount("https://", self._adapter)
+
+
+    @property
+    def url(self):
+        """Base URL of the API server."""
+
+        return self._url
 
 
-    def _send(self, method, endpoint, data=None, content_type="application/json"):
-        """Send a request to the API and return the JSON data from the response."""
+    def cancel(self):
+        """Cancel all pending and in-flight requests, e.g. when the user hits Ctrl-C.
+
+        Requests waiting for a response are aborted and any further request fails immediately.
+        """
+
+        self._cancelled.set()
+        self._adapter.abort()
+        self._session.close()
+
+
+    @contextlib.contextmanager
+    def cancel_on_interrupt(self):
+        """Cancel all requests if the context is left because of Ctrl-C, for use inside the context of a thread pool."""
+
+        try:
+            yield
+        except KeyboardInterrupt:
+            log.warning("Interrupted, cancelling pending requests...")
+            self.cancel()
+            raise
+
+
+    def _send(self, method, endpoint, data=None, content_type="application/json", operation="metadata", timeout=None):
+        """Send a request to the API and return the JSON data from the response.
+
+        operation is the class of the operation, which determines the timeout unless it is given explicitly.
+        For Cypher queries, the timeout is also passed to the server as hint to stop the query in time.
+        """
 
         if not self._url:
             raise ApiException("Invalid API URL configured, run the auth subcommand first.")
+        if self._cancelled.is_set():
+            raise ApiException("Request cancelled.")
 
         endpoint_url = urllib.parse.urljoin(self._url, endpoint)
         headers = {
             "User-Agent": "bhcli",
         }
 
-        if data is not None:
-            if isinstance(data, (dict, list)):
-                data = json.dumps(data).encode()
+        body = data
+        if body is not None:
+            if isinstance(body, (dict, list)):
+                body = codec.dumps(body)
             headers["Content-Type"] = content_type
+            if self._compress_requests and content_type == "application/json" and len(body) >= COMPRESSION_THRESHOLD:
+                body = gzip.compress(body, compresslevel=6)
+                headers["Content-Encoding"] = "gzip"
 
         if self._token_id is not None:
             # compute the authentication MAC according to the BloodHound docs
@@ -63,8 +192,9 @@ class Api:
             datetime_formatted = datetime.datetime.now().astimezone().isoformat("T")
             digester.update(datetime_formatted[:13].encode())
             digester = hmac.new(digester.digest(), None, hashlib.sha256)
-            if data is not None:
-                digester.update(data)
+            if body is not None:
+                # the signature covers the bytes actually sent, i.e. after compression
+                digester.update(body)
             headers["Authorization"] = f"bhesignature {self._token_id}"
             headers["RequestDate"] = datetime_formatted
             headers["Signature"] = base64.b64encode(digester.digest())
@@ -72,14 +202,29 @@ class Api:
             # use Bearer authentication as an alternative
             headers["Authorization"] = f"Bearer {self._bearer}"
 
+        hint = ""
+        if timeout is None:
+            timeout = self.timeouts[operation]
+            hint = f" Use 'bhcli --timeout {operation}=SECONDS ...' to wait longer."
+        if operation == "cypher":
+            headers["Prefer"] = f"wait={int(timeout)}"
+
         log.debug("Sending %s request to API endpoint %s", method, endpoint)
         try:
-            result = requests.request(method=method, url=endpoint_url, headers=headers, data=data, timeout=(3.1, 60))
-        except requests.exceptions.ConnectionError as e:
+            result = self._session.request(method=method, url=endpoint_url, headers=headers, data=body, timeout=(CONNECT_TIMEOUT, timeout))
+        except requests.exceptions.RequestException as e:
+            if self._cancelled.is_set():
+                raise ApiException("Request cancelled.") from e
+            if isinstance(e, requests.exceptions.ReadTimeout):
+                raise ApiException(f"Request to API server timed out after {timeout} seconds.{hint}") from e
+            if not isinstance(e, requests.exceptions.ConnectionError):
+                raise
             log.debug("Got error during connection attempt. Original error is: %s", e)
             raise ApiException(f"Could not connect to API server at '{self._url}'. Make sure BloodHound is running and accessible or run 'bhcli --debug ...' for more information.") from e
         log.debug("Received response with code %d:", result.status_code)
-        log.debug("%s", result.text)
+        if log.isEnabledFor(logging.DEBUG):
+            # decoding the text of large responses is expensive, so only do it when needed
+            log.debug("%s", result.text)
 
         if not result.ok:
             if result.status_code == 401:
@@ -88,11 +233,11 @@ class Api:
                 delay = 1
                 log.info("Hit request rate limiting. Waiting for %d seconds, then trying again...", delay)
                 time.sleep(delay)
-                return self._send(method, endpoint, data, content_type)
+                return self._send(method, endpoint, data, content_type, operation, timeout)
             raise ApiException("Received unexpected response from server. Run 'bhcli --debug ...' for more information.", result)
 
         if result.content:
-            return result.json()["data"]
+            return codec.loads(result.content)["data"]
         return {}
 
 
@@ -127,15 +272,33 @@ class Api:
         return self._send("POST", endpoint, data)
 
 
-    def upload_status(self, file_upload_id=None):
-        """Return status of file upload jobs."""
+    def upload_status(self, file_upload_id=None, status=None, sort_by=None, limit=None):
+        """Return status of file upload jobs, optionally only of those with a specific status."""
 
         endpoint = "/api/v2/file-upload"
+        params = []
         if file_upload_id is not None:
-            endpoint += f"?id=eq:{file_upload_id}"
+            params.append(f"id=eq:{file_upload_id}")
+        if status is not None:
+            params.append(f"status=eq:{status}")
+        if sort_by is not None:
+            params.append(f"sort_by={urllib.parse.quote_plus(sort_by)}")
+        if limit is not None:
+            params.append(f"limit={limit}")
+        if params:
+            endpoint += "?" + "&".join(params)
         return self._send("GET", endpoint)
 
 
+    def last_ingest(self):
+        """Return the end time of the most recently completed file upload job, or None if there is none."""
+
+        endpoint = "/api/v2/file-upload?status=eq:2&sort_by=-end_time&limit=1"
+        jobs = self._send("GET", endpoint)
+        end_times = [job["end_time"] for job in jobs if job.get("status") == UploadStatus.COMPLETE]
+        return max(end_times, default=None)
+
+
     def start_upload(self):
         """Start a new file upload job."""
 
@@ -147,7 +310,7 @@ class Api:
         """Upload a file to an existing file upload job."""
 
         endpoint = f"/api/v2/file-upload/{file_upload_id}"
-        return self._send("POST", endpoint, file_content, content_type)
+        return self._send("POST", endpoint, file_content, content_type, operation="upload")
 
 
     def end_upload(self, file_upload_id):
@@ -163,7 +326,7 @@ class Api:
         endpoint = f"/api/v2/search?q={urllib.parse.quote_plus(name)}"
         if kind is not None:
             endpoint += f"&type={urllib.parse.quote_plus(kind)}"
-        return self._send("GET", endpoint)
+        return self._send("GET", endpoint, operation="search")
 
 
     def get_asset_groups(self, tag=None):
@@ -189,29 +352,59 @@ class Api:
     def add_to_asset_group(self, asset_group_id, sids):
         """Add one or more objects identified by their sid to an asset group."""
 
-        endpoint = f"/api/v2/asset-groups/{asset_group_id}/selectors"
         if isinstance(sids, str):
             sids = [sids]
+        self.update_asset_group_selectors(asset_group_id, add=sids)
+
+
+    def update_asset_group_selectors(self, asset_group_id, add=(), remove=(), chunk_size=1000):
+        """Add and remove objects identified by their sid to and from an asset group.
+
+        The changes are sent in requests of at most chunk_size selectors each.
+        """
+
+        endpoint = f"/api/v2/asset-groups/{asset_group_id}/selectors"
         data = [
             {
-                "action": "add",
+                "action": action,
                 "selector_name": sid,
                 "sid": sid,
             }
+            for action, sids in (("add", add), ("remove", remove))
             for sid in sids
         ]
-        return self._send("PUT", endpoint, data)
+        for i in range(0, len(data), chunk_size):
+            self._send("PUT", endpoint, data[i:i + chunk_size])
 
 
-    def get_saved_queries(self, sort_by=None):
-        """Get saved custom queries."""
+    def get_saved_queries(self, sort_by=None, skip=None, limit=None):
+        """Get saved custom queries, optionally only a page of them."""
 
         endpoint = "/api/v2/saved-queries"
+        params = {}
         if sort_by is not None:
-            endpoint += f"?sort_by={urllib.parse.quote_plus(sort_by)}"
+            params["sort_by"] = sort_by
+        if skip is not None:
+            params["skip"] = skip
+        if limit is not None:
+            params["limit"] = limit
+        if params:
+            endpoint += f"?{urllib.parse.urlencode(params)}"
         return self._send("GET", endpoint)
 
 
+    def iter_saved_queries(self, sort_by=None, page_size=500):
+        """Yield all saved custom queries, fetched in pages of page_size."""
+
+        skip = 0
+        while True:
+            page = self.get_saved_queries(sort_by=sort_by, skip=skip, limit=page_size)
+            yield from page
+            if len(page) < page_size:
+                break
+            skip += page_size
+
+
     def add_saved_query(self, name, query, description=""):
         """Add a custom query."""
 
@@ -224,6 +417,18 @@ class Api:
         return self._send("POST", endpoint, data)
 
 
+    def update_saved_query(self, query_id, name, query, description=""):
+        """Update an existing custom query."""
+
+        endpoint = f"/api/v2/saved-queries/{query_id}"
+        data = {
+            "name": name,
+            "query": query,
+            "description": description,
+        }
+        return self._send("PUT", endpoint, data)
+
+
     def domains(self, collected=None):
         """Return available domains."""
 
@@ -233,8 +438,40 @@ class Api:
         return self._send("GET", endpoint)
 
 
-    def cypher(self, query, include_properties=True):
-        """Run a raw Cypher query."""
+    def domain_quality_stats(self, domain_id):
+        """Return the latest object counts computed by the server for a domain during analysis, or None if there are none."""
+
+        endpoint = f"/api/v2/ad-domains/{urllib.parse.quote(domain_id)}/data-quality-stats?sort_by=-created_at&limit=1"
+        stats = self._send("GET", endpoint)
+        return stats[0] if stats else None
+
+
+    def domain_directory(self, max_age=0, refresh=False):
+        """Return the directory of available domains, fetched only once per instance.
+
+        With max_age, a directory stored locally by an earlier run is used if it is not older than max_age seconds.
+        With refresh, a directory that was loaded from the local state is fetched again from the server.
+        """
+
+        with self._directory_lock:
+            if self._directory is not None and not (refresh and self._directory.stored):
+                return self._directory
+            if max_age and not refresh:
+                stored = state.load("domains", self._url)
+                if stored is not None and time.time() - stored["fetched"] <= max_age:
+                    log.debug("Using stored domain directory")
+                    self._directory = DomainDirectory(stored["domains"], stored["fetched"], stored=True)
+                    return self._directory
+            self._directory = DomainDirectory(self.domains())
+            state.save("domains", self._url, {"fetched": self._directory.fetched, "domains": self._directory.domains})
+            return self._directory
+
+
+    def cypher(self, query, include_properties=True, timeout=None):
+        """Run a raw Cypher query.
+
+        timeout overrides the timeout in seconds for Cypher queries for this query only.
+        """
 
         query = query.strip()
         log.debug("Prepared Cypher query: %s", query)
@@ -244,21 +481,63 @@ class Api:
             "query": query,
         }
         try:
-            return self._send("POST", endpoint, data)
+            return self._send("POST", endpoint, data, operation="cypher", timeout=timeout)
         except ApiException as e:
             if e.response is not None and e.response.status_code == 404:
                 return { "nodes": {}, "edges": [] }
             raise
 
 
-    def _objects(self, kind, **kwargs):
-        """Return objects of a given kind, filtered by properties given in kwargs."""
+    def cypher_edges(self, query):
+        """Run a Cypher query returning paths and return all their edges as (source, edge, target) tuples.
 
-        query = f"""MATCH ({cypher.node("n", kind)})
-                {cypher.where("n", **kwargs)}
-                RETURN n
-                """
-        return self.cypher(query)["nodes"].values()
+        Node properties are not requested, so nodes only contain label, kind and objectId.
+        This is much lighter than a full graph for queries that are only interested in relations.
+        """
+
+        result = self.cypher(query, include_properties=False)
+        nodes = result["nodes"]
+        return [(nodes[edge["source"]], edge, nodes[edge["target"]]) for edge in result["edges"]]
+
+
+    def _objects(self, kind, include_properties=True, partitions=1, key=None, **kwargs):
+        """Return objects of a given kind, filtered by properties given in kwargs.
+
+        Without include_properties, objects only contain label, kind and objectId.
+        With partitions > 1, the listing is split into disjoint partitions by the last character of the
+        object ID (see PARTITION_SUFFIXES), which are fetched concurrently and merged.
+        If key is given, the objects are returned as list sorted by this key function.
+        Properties given as list match objects with any of the listed values, e.g. domainsid=[sid1, sid2]
+        fetches the objects of several domains in one query.
+        """
+
+        partitions = max(1, min(partitions, len(PARTITION_SUFFIXES)))
+        conditions = cypher.conditions("n", **{k: v for k, v in kwargs.items() if not isinstance(v, list)}) \
+            + cypher.conditions("n", comparison_operator="IN", **{k: v for k, v in kwargs.items() if isinstance(v, list)})
+
+        def fetch(condition):
+            clauses = conditions + [condition] if condition else conditions
+            where = "WHERE " + " AND ".join(clauses) if clauses else ""
+            query = f"""MATCH ({cypher.node("n", kind)})
+                    {where}
+                    RETURN n
+                    """
+            result = self.cypher(query, include_properties=include_properties)["nodes"].values()
+            return sorted(result, key=key) if key is not None else list(result)
+
+        if partitions == 1:
+            result = fetch(None)
+        else:
+            buckets = [PARTITION_SUFFIXES[i::partitions] for i in range(partitions - 1)]
+            partition_conditions = [cypher.ends_with("n", "objectid", suffixes) for suffixes in buckets]
+            partition_conditions.append(cypher.ends_with("n", "objectid", "".join(buckets), negate=True))
+            with concurrent.futures.ThreadPoolExecutor(max_workers=partitions) as executor, self.cancel_on_interrupt():
+                parts = list(executor.map(fetch, partition_conditions))
+            if key is not None:
+                result = list(heapq.merge(*parts, key=key))
+            else:
+                result = [node for part in parts for node in part]
+        return result
 
 
     def users(self, **kwargs):
@@ -279,6 +558,12 @@ class Api:
         return self._objects("Group", **kwargs)
 
 
+    def domain_objects(self, **kwargs):
+        """Return domain objects, filtered by properties given in kwargs."""
+
+        return self._objects("Domain", **kwargs)
+
+
     def group_members(self, group_sid, kind=None, indirect_members=True):
         """Return members of a given group (includes indirect members by default)."""
 
@@ -289,6 +574,191 @@ class Api:
         return self.cypher(query)["nodes"].values()
 
 
+    def find_groups(self, names=(), rids=()):
+        """Return the groups with any of the given names or well-known RIDs (in all domains).
+
+        Only the labels, kinds and object ids of the groups are retrieved, not their properties.
+        """
+
+        conditions = []
+        if names:
+            conditions.append(f"g.name IN {cypher.escape([name.upper() for name in names])}")
+        conditions.extend(cypher.well_known_sid("g", rid) for rid in rids)
+        if not conditions:
+            return []
+        query = f"""MATCH (g:Group)
+                WHERE {" OR ".join(conditions)}
+                RETURN g
+                """
+        return list(self.cypher(query, include_properties=False)["nodes"].values())
+
+
+    def groups_members(self, group_sids, indirect_members=True):
+        """Return the members of several groups at once as dict of group sid and list of member nodes.
+
+        All direct memberships in the given groups, or for indirect members in the groups nested into them,
+        are fetched in one traversal, and the members of each group are resolved from them locally.
+        """
+
+        group_filter = cypher.where("g", comparison_operator="IN", objectid=list(group_sids))
+        if indirect_members:
+            query = f"""MATCH (x:Group)-[:MemberOf*0..]->(g:Group)
+                    {group_filter}
+                    WITH DISTINCT x
+                    MATCH p=(m)-[:MemberOf]->(x)
+                    RETURN p
+                    """
+        else:
+            query = f"""MATCH p=(m)-[:MemberOf]->(g:Group)
+                    {group_filter}
+                    RETURN p
+                    """
+        result = self.cypher(query)
+        nodes = result["nodes"]
+        by_sid = {node["objectId"]: node_id for node_id, node in nodes.items()}
+        direct_members = {}
+        for edge in result["edges"]:
+            direct_members.setdefault(edge["target"], []).append(edge["source"])
+
+        members = {}
+        for group_sid in group_sids:
+            start = by_sid.get(group_sid)
+            found = set()
+            pending = [start] if start is not None else []
+            while pending:
+                for member in direct_members.get(pending.pop(), []):
+                    if member not in found:
+                        found.add(member)
+                        if indirect_members:
+                            pending.append(member)
+            found.discard(start)
+            members[group_sid] = [nodes[member] for member in found]
+        return members
+
+
+    def iter_nodes(self, after_id=None, page_size=10000):
+        """Yield all nodes with properties in pages of page_size, as lists of (id, node) tuples ordered by graph id.
+
+        Paging is done by graph id, starting after the node with graph id after_id if given.
+        """
+
+        while True:
+            after_clause = f"WHERE id(n) > {int(after_id)}" if after_id is not None else ""
+            query = f"""MATCH (n)
+                    {after_clause}
+                    RETURN n
+                    ORDER BY id(n)
+                    LIMIT {int(page_size)}
+                    """
+            nodes = self.cypher(query)["nodes"]
+            page = sorted((int(node_id), node) for node_id, node in nodes.items())
+            if page:
+                yield page
+                after_id = page[-1][0]
+            if len(page) < page_size:
+                break
+
+
+    def iter_edges(self, relation_types=None, include_properties=True, after_id=None, page_size=1000):
+        """Yield all edges in pages, as lists of (source, edge, target) tuples, optionally only of some relation types.
+
+        Paging is done by the graph id of the source nodes: a page holds all outgoing edges of up to
+        page_size source nodes and is ordered by their graph id. To continue after a page, pass the graph id
+        of the source of its last edge (edge["source"]) as after_id.
+        Without include_properties, neither nodes nor edges contain properties.
+        """
+
+        types = cypher.relationship_types(relation_types) if relation_types else ""
+        while True:
+            after_clause = f"WHERE id(a) > {int(after_id)}" if after_id is not None else ""
+            query = f"""MATCH (a)-[{types}]->()
+                    {after_clause}
+                    WITH DISTINCT a
+                    ORDER BY id(a)
+                    LIMIT {int(page_size)}
+                    MATCH p=(a)-[r{types}]->()
+                    RETURN p
+                    """
+            result = self.cypher(query, include_properties=include_properties)
+            nodes = result["nodes"]
+            page = sorted(
+                ((nodes[edge["source"]], edge, nodes[edge["target"]]) for edge in result["edges"]),
+                key=lambda t: int(t[1]["source"]),
+            )
+            if page:
+                yield page
+                after_id = int(page[-1][1]["source"])
+            if len({edge["source"] for _, edge, _ in page}) < page_size:
+                break
+
+
+    def objects_by_sid(self, sids, chunk_size=5000):
+        """Return objects identified by their sid, fetched in chunks of chunk_size."""
+
+        sids = list(sids)
+        result = []
+        for i in range(0, len(sids), chunk_size):
+            query = f"""MATCH (n)
+                    {cypher.where("n", comparison_operator="IN", objectid=sids[i:i + chunk_size])}
+                    RETURN n
+                    """
+            result.extend(self.cypher(query)["nodes"].values())
+        return result
+
+
+    def objects_by_name(self, names, kinds=None, chunk_size=5000):
+        """Return objects identified by their name, optionally restricted to some kinds, fetched in chunks of chunk_size.
+
+        Only the labels, kinds and object ids of the nodes are retrieved, not their properties.
+        """
+
+        names = [name.upper() for name in names]
+        kind_filter = ""
+        if kinds:
+            kind_filter = "AND (" + " OR ".join(f"n:`{cypher.escape(kind)}`" for kind in kinds) + ")"
+        result = []
+        for i in range(0, len(names), chunk_size):
+            query = f"""MATCH (n)
+                    {cypher.where("n", comparison_operator="IN", name=names[i:i + chunk_size])}
+                    {kind_filter}
+                    RETURN n
+                    """
+            result.extend(self.cypher(query, include_properties=False)["nodes"].values())
+        return result
+
+
+    def shortest_paths(self, source_sid, target_sids, max_hops=None, limit=None, relations=None, exclude_relations=None):
+        """Return the shortest paths from a source node to any of the target nodes.
+
+        The paths can be restricted to specific relation types or exclude some of them. Both restrict the
+        traversal itself, so a longer path avoiding excluded relations is found if the shortest one uses them.
+        The maximum number of hops and of returned paths is enforced by the server.
+        """
+
+        hops = f"*1..{max_hops}" if max_hops else "*1.."
+        exclude_relations = list(exclude_relations or [])
+        exclude_clause = ""
+        if relations:
+            pattern = f"[{cypher.relationship_types([r for r in relations if r not in exclude_relations])}{hops}]"
+        else:
+            pattern = f"[{hops}]"
+            if exclude_relations:
+                # a universal predicate on the relationships is evaluated during the shortest path search
+                exclude_clause = f"WHERE all(r IN relationships(p) WHERE NOT type(r) IN {cypher.escape(exclude_relations)})"
+        limit_clause = f"LIMIT {int(limit)}" if limit else ""
+        query = f"""MATCH (s)
+                {cypher.where("s", objectid=source_sid)}
+                MATCH (t)
+                {cypher.where("t", comparison_operator="IN", objectid=list(target_sids))}
+                AND s <> t
+                MATCH p=shortestPath((s)-{pattern}->(t))
+                {exclude_clause}
+                RETURN p
+                {limit_clause}
+                """
+        return self.cypher(query, include_properties=False)
+
+
     def root_cas(self, **kwargs):
         """Return RootCA objects, filtered by properties given in kwargs."""
 
@@ -0,0 +1,56 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+BACKEND = "orjson" if orjson is not None else "msgspec" if msgspec is not None else "json"
+"""Name of the JSON library in use, the fastest one installed."""
+
+
+if BACKEND == "orjson":
+    def loads(data):
+        """Decode JSON from bytes or str."""
+
+        return orjson.loads(data)
+
+
+    def dumps(obj):
+        """Encode an object as compact JSON and return the bytes."""
+
+        return orjson.dumps(obj)
+
+elif BACKEND == "msgspec":
+    _decoder = msgspec.json.Decoder()
+    _encoder = msgspec.json.Encoder()
+
+
+    def loads(data):
+        """Decode JSON from bytes or str."""
+
+        return _decoder.decode(data)
+
+
+    def dumps(obj):
+        """Encode an object as compact JSON and return the bytes."""
+
+        return _encoder.encode(obj)
+
+else:
+    def loads(data):
+        """Decode JSON from bytes or str."""
+
+        return json.loads(data)
+
+
+    def dumps(obj):
+        """Encode an object as compact JSON and return the bytes."""
+
+        return json.dumps(obj, separators=(",", ":")).encode()
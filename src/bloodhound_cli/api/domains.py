@@ -0,0 +1,61 @@
+import re
+import time
+
+
+DIRECTORY_TTL = 600
+"""Number of seconds a stored domain directory is used for resolving domains and for completion."""
+
+_SID_PATTERN = re.compile(r"S-1-5-21(-[0-9]+){3}", re.IGNORECASE)
+
+
+def is_domain_sid(value):
+    """Return whether a value is a domain SID."""
+
+    return _SID_PATTERN.fullmatch(value) is not None
+
+
+class DomainDirectory:
+    """Index of the domains available on an API server by DNS name, NetBIOS name and SID.
+
+    The NetBIOS name is taken from the domain's netbios property if the server provides it,
+    otherwise the first label of the DNS name is used if it is unambiguous.
+    """
+
+    def __init__(self, domains, fetched=None, stored=False):
+        """Build the directory from the entries returned by Api.domains().
+
+        fetched is the time the entries were retrieved from the server and stored tells
+        whether they were loaded from a local state file instead.
+        """
+
+        self.domains = sorted(domains, key=lambda d: d["name"])
+        self.fetched = time.time() if fetched is None else fetched
+        self.stored = stored
+        self._by_name = {}
+        self._by_sid = {}
+        self._by_netbios = {}
+        ambiguous = set()
+        for domain in self.domains:
+            self._by_name[domain["name"].upper()] = domain
+            self._by_sid[domain["id"].upper()] = domain
+            netbios = (domain.get("netbios") or domain["name"].split(".")[0]).upper()
+            if netbios in self._by_netbios:
+                ambiguous.add(netbios)
+            self._by_netbios[netbios] = domain
+        for netbios in ambiguous:
+            del self._by_netbios[netbios]
+
+
+    def get(self, value):
+        """Return the domain given by DNS name, NetBIOS name or SID, or None if it is unknown."""
+
+        key = value.upper()
+        if is_domain_sid(key):
+            return self._by_sid.get(key)
+        return self._by_name.get(key) or self._by_netbios.get(key)
+
+
+    def collected(self):
+        """Return the domains for which data was collected, sorted by name."""
+
+        return [domain for domain in self.domains if domain.get("collected")]
@@ -1,5 +1,93 @@
+import contextlib
+import sys
+import threading
+
 from bloodhound_cli.config import config
-from . import Api
+from bloodhound_cli.logger import log
+from . import TIMEOUTS, Api
+
+
+class ProfileApi:
+    """Proxy forwarding to the Api instance of a profile from the configuration file.
+
+    The profile is the one selected for the current thread with use_profile(),
+    or the current profile of the configuration otherwise.
+    Api instances are created on first use and shared between threads.
+    """
+
+    def __init__(self):
+        self._instances = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._timeouts = {}
+
+
+    def _current(self):
+        profile = getattr(self._local, "profile", None) or config.profile
+        with self._lock:
+            if profile not in self._instances:
+                missing = config.missing_keys(profile)
+                if missing:
+                    log.error("Profile %s is incomplete, %s not set. Use the auth subcommand with --profile to configure it.", profile, ", ".join(missing))
+                    sys.exit(1)
+                self._instances[profile] = Api(
+                    url=config.get("url", profile),
+                    token_id=config.get("token_id", profile),
+                    token_key=config.get("token_key", profile),
+                    timeouts=self._timeouts,
+                    compress_requests=config.getboolean("compress_requests", profile),
+                )
+            return self._instances[profile]
+
+
+    @contextlib.contextmanager
+    def use_profile(self, profile):
+        """Use the server of the given profile in the current thread for the duration of the context."""
+
+        previous = getattr(self._local, "profile", None)
+        self._local.profile = profile
+        try:
+            yield
+        finally:
+            self._local.profile = previous
+
+
+    def set_timeouts(self, timeouts):
+        """Override the timeouts of some classes of operations for all profiles."""
+
+        with self._lock:
+            self._timeouts.update(timeouts)
+            for instance in self._instances.values():
+                instance.timeouts.update(timeouts)
+
+
+    def reset_timeouts(self):
+        """Restore the default timeouts for all profiles."""
+
+        with self._lock:
+            self._timeouts.clear()
+            for instance in self._instances.values():
+                instance.timeouts = dict(TIMEOUTS)
+
+
+    def reset(self):
+        """Forget all Api instances, so they are created again from the configuration on next use."""
+
+        with self._lock:
+            self._instances.clear()
+
+
+    def cancel(self):
+        """Cancel all pending and in-flight requests to the servers of all profiles."""
+
+        with self._lock:
+            for instance in self._instances.values():
+                instance.cancel()
+
+
+    def __getattr__(self, name):
+        return getattr(self._current(), name)
+
 
-# create an Api instance with settings obtained from the configuration file
-api = Api(url=config.get("url"), token_id=config.get("token_id"), token_key=config.get("token_key"))
+# proxy for Api instances with settings obtained from the configuration file
+api = ProfileApi()
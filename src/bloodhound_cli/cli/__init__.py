@@ -1,39 +1,82 @@
+import sys
+
 import click
 
 from bloodhound_cli.__about__ import __version__
 from bloodhound_cli import logger
+from bloodhound_cli.api.from_config import api
+from bloodhound_cli.config import config
+from bloodhound_cli.logger import log
 from .audit import audit
 from .auth import auth
+from .batch import batch
 from .computers import computers
 from .cypher import cypher
+from .daemon import daemon
 from .domains import domains
+from .export import export
+from .exposure import exposure
+from .generate import generate
 from .groups import groups
 from .mark import mark
 from .members import members
+from .paramtypes import ProfileType, TimeoutType
+from .paths import paths
 from .queries import queries
 from .stats import stats
 from .upload import upload
 from .users import users
+from .watch import watch
 
 
 @click.group(context_settings={"help_option_names": ["-h", "--help"]})
 @click.option("--debug", is_flag=True, help="Enable debug output.")
+@click.option("--profile", metavar="NAME", type=ProfileType(), envvar="BHCLI_PROFILE", help="Use the server configured in the named profile.")
+@click.option("--all-profiles", is_flag=True, help="Run a read command against the servers of all profiles.")
+@click.option("--timeout", "timeouts", metavar="[CLASS=]SECONDS", type=TimeoutType(), multiple=True, help="Timeout for API requests, optionally for one class of operations only (metadata, search, cypher or upload).")
 @click.version_option(version=__version__, prog_name="bhcli")
-def bloodhound_cli(debug=False):
+@click.pass_context
+def bloodhound_cli(ctx, debug=False, profile=None, all_profiles=False, timeouts=()):
     """CLI tool to interact with the BloodHound CE API"""
 
     logger.set_loglevel(debug)
 
+    for timeout in timeouts:
+        api.set_timeouts(timeout)
+
+    if profile is not None:
+        # the auth subcommand creates new profiles
+        if profile not in config.profiles() and ctx.invoked_subcommand != "auth":
+            log.error("Unknown profile %s, use the auth subcommand with --profile to configure it.", profile)
+            sys.exit(1)
+        config.profile = profile
+
+    if all_profiles:
+        command = ctx.command.get_command(ctx, ctx.invoked_subcommand)
+        if not getattr(command.callback, "fan_out", False):
+            log.error("The %s subcommand does not support --all-profiles.", ctx.invoked_subcommand)
+            sys.exit(1)
+        if not config.profiles():
+            log.error("No profiles configured, use the auth subcommand first.")
+            sys.exit(1)
+
 
 bloodhound_cli.add_command(audit)
 bloodhound_cli.add_command(auth)
+bloodhound_cli.add_command(batch)
 bloodhound_cli.add_command(computers)
 bloodhound_cli.add_command(cypher)
+bloodhound_cli.add_command(daemon)
 bloodhound_cli.add_command(domains)
+bloodhound_cli.add_command(export)
+bloodhound_cli.add_command(exposure)
+bloodhound_cli.add_command(generate)
 bloodhound_cli.add_command(groups)
 bloodhound_cli.add_command(mark)
 bloodhound_cli.add_command(members)
+bloodhound_cli.add_command(paths)
 bloodhound_cli.add_command(queries)
 bloodhound_cli.add_command(stats)
 bloodhound_cli.add_command(upload)
 bloodhound_cli.add_command(users)
+bloodhound_cli.add_command(watch)
@@ -1,13 +1,16 @@
-import sys
+import hashlib
 
 import click
 import prettytable
 
-from bloodhound_cli import cypher
+from bloodhound_cli import cypher, state
 from bloodhound_cli.api.from_config import api
 from bloodhound_cli.constants import RID
 from bloodhound_cli.logger import log
-from .paramtypes import DomainType
+from bloodhound_cli.membership import MembershipIndex
+from .output import Output, format_option
+from .paramtypes import DomainType, selected_domains
+from .profiles import fan_out
 
 
 boring_relations = [
@@ -17,100 +20,172 @@ boring_relations = [
     "MemberOfLocalGroup",
 ]
 
+adcs_relations = [
+    "ADCSESC1",
+    "ADCSESC3",
+    "ADCSESC4",
+    "ADCSESC6a",
+    "ADCSESC6b",
+    "ADCSESC9a",
+    "ADCSESC9b",
+    "ADCSESC10a",
+    "ADCSESC10b",
+    "ADCSESC13",
+    "GoldenCert",
+]
 
-@click.command()
-@click.option("--domain", "-d", type=DomainType(), help="Audit specific domain only.")
-def audit(domain):
-    """Audit domains for potential security issues."""
 
-    domains = sorted((d["name"], d["id"]) for d in api.domains(collected=True))
-    if domain:
-        domains = [d for d in domains if d[0] == domain.upper()]
-        if not domains:
-            log.error("Unknown domain %s.", domain)
-            sys.exit(1)
+class AuditCheck:
+    """A single audit check, producing rows of findings for a domain."""
 
-    for dom, domsid in domains:
-        print(dom)
-        print("=" * len(dom))
-        print()
-
-        print("[*] Interesting privileges for domain users or computers")
-        query = f"""MATCH (b:Group)-[:MemberOf*0..]->(g:Group)
-                {cypher.where("b", comparison_operator="IN", objectid=[f"{domsid}-{RID.DOMAIN_USERS}", f"{domsid}-{RID.DOMAIN_COMPUTERS}"])}
-                WITH g
-                MATCH p=(g)-[r]->(o)
-                WHERE NOT type(r) IN {cypher.escape(boring_relations)}
-                RETURN p
-                """
-        result = api.cypher(query)
-        nodes = result["nodes"]
-        edges = result["edges"]
-        relations = set()
-        for edge in edges:
-            relations.add((nodes[edge['source']]['label'], edge['label'], nodes[edge['target']]['label'], nodes[edge['target']]['kind']))
-        count = len(relations)
-        print(f"    {count} relations found")
-        if count > 0:
+    def __init__(self, func, title, noun, fields, line=None, batched=False, tags=()):
+        """Create an audit check.
+
+        func is called with the domain SID and a MembershipIndex (or None if not in use)
+        and returns a sorted list of rows, one tuple per finding.
+        Batched checks evaluate several domains at once, func is called with a list of
+        domain SIDs instead and returns a dict mapping domain SIDs to rows.
+        The rows are either printed as table with the given field names or line by line,
+        either with the line format string or only the first field.
+        tags are the asset group tags the findings depend on, which can change without an ingest.
+        """
+
+        self.func = func
+        self.name = func.__name__
+        self.title = title
+        self.noun = noun
+        self.fields = fields
+        self.keys = [field.lower().replace(" ", "_") for field in fields]
+        self.line = line
+        self.batched = batched
+        self.tags = list(tags)
+
+
+    def run(self, domsid, index=None):
+        """Run the check for a domain and return the findings."""
+
+        if self.batched:
+            return self.run_many([domsid], index)[domsid]
+        return [tuple(row) for row in self.func(domsid, index)]
+
+
+    def run_many(self, domsids, index=None):
+        """Run the check for several domains and return a dict mapping domain SIDs to findings.
+
+        Batched checks need a single evaluation for all domains, other checks are run per domain.
+        """
+
+        if not self.batched:
+            return {domsid: self.run(domsid, index) for domsid in domsids}
+        result = self.func(list(domsids), index)
+        return {domsid: [tuple(row) for row in result.get(domsid, [])] for domsid in domsids}
+
+
+    def format_row(self, row):
+        """Return a finding formatted as a single line."""
+
+        if self.line is not None:
+            return self.line.format(*row)
+        return "    ".join(str(field) for field in row)
+
+
+    def print(self, rows):
+        """Print the findings of this check."""
+
+        print(f"[*] {self.title}")
+        print(f"    {len(rows)} {self.noun} found")
+        if rows and len(self.fields) > 1 and self.line is None:
             table = prettytable.PrettyTable()
             table.set_style(prettytable.PLAIN_COLUMNS)
             table.align = "l"
-            table.field_names = ["Group", "Relation", "Target", "Kind of Target"]
-            table.add_rows(sorted(relations))
+            table.field_names = self.fields
+            table.add_rows(rows)
             print(table)
-        print()
-
-        print("[*] Interesting privileges for guests")
-        query = f"""MATCH (b:User)-[:MemberOf*0..]->(g)
-                {cypher.where("b", objectid=f"{domsid}-{RID.GUEST}")}
-                WITH g
-                MATCH p=(g)-[r]->(o)
-                WHERE NOT type(r) IN {cypher.escape(boring_relations)}
-                RETURN p
+        else:
+            for row in rows:
+                print(self.format_row(row))
+
+
+checks = []
+"""All audit checks in the order they are run."""
+
+
+def audit_check(title, noun, fields, line=None, batched=False, tags=()):
+    """Decorator registering a function as an audit check."""
+
+    def decorator(func):
+        checks.append(AuditCheck(func, title, noun, fields, line, batched, tags))
+        return func
+    return decorator
+
+
+def _relations(edges):
+    """Return sorted distinct (source, relation, target, kind of target) tuples from (source, edge, target) tuples."""
+
+    return sorted({(source["label"], edge["label"], target["label"], target["kind"]) for source, edge, target in edges})
+
+
+def _privileges(principal_sids, kind, index):
+    """Return interesting relations of principals of a kind and all groups they are (indirectly) member of."""
+
+    if index is not None:
+        sids = set(principal_sids)
+        for sid in principal_sids:
+            sids.update(index.groups(sid))
+        query = f"""MATCH p=(g)-[r]->(o)
+                {cypher.where("g", comparison_operator="IN", objectid=sorted(sids))}
+                AND NOT type(r) IN {cypher.escape(boring_relations)}
+                RETURN DISTINCT p
                 """
-        result = api.cypher(query)
-        nodes = result["nodes"]
-        edges = result["edges"]
-        relations = set()
-        for edge in edges:
-            relations.add((nodes[edge['source']]['label'], edge['label'], nodes[edge['target']]['label'], nodes[edge['target']]['kind']))
-        count = len(relations)
-        print(f"    {count} relations found")
-        if count > 0:
-            table = prettytable.PrettyTable()
-            table.set_style(prettytable.PLAIN_COLUMNS)
-            table.align = "l"
-            table.field_names = ["Guest Object", "Relation", "Target", "Kind of Target"]
-            table.add_rows(sorted(relations))
-            print(table)
-        print()
-
-        print("[*] Kerberoastable user accounts of high value (enabled, no MSA/gMSA)")
-        result = api.users(domainsid=domsid, hasspn=True, enabled=True)
-        result = [
-            n
-            for n in result
-            if "admin_tier_0" in n["properties"].get("system_tags", "")
-            and not n["properties"].get("msa", False)
-            and not n["properties"].get("gmsa", False)
-        ]
-        count = len(result)
-        print(f"    {count} accounts found")
-        result = sorted(n["properties"]["name"] for n in result)
-        for n in result:
-            print(n)
-        print()
-
-        print("[*] AS-REP-roastable user accounts (enabled)")
-        result = api.users(domainsid=domsid, dontreqpreauth=True, enabled=True)
-        count = len(result)
-        print(f"    {count} accounts found")
-        result = sorted(n["properties"]["name"] for n in result)
-        for n in result:
-            print(n)
-        print()
-
-        print("[*] Accounts trusted for unconstrained delegation (enabled, no DCs)")
+        return _relations(api.cypher_edges(query))
+
+    query = f"""MATCH ({cypher.node("b", kind)})-[:MemberOf*0..]->(g)
+            {cypher.where("b", comparison_operator="IN", objectid=list(principal_sids))}
+            WITH DISTINCT g
+            MATCH p=(g)-[r]->(o)
+            WHERE NOT type(r) IN {cypher.escape(boring_relations)}
+            RETURN DISTINCT p
+            """
+    return _relations(api.cypher_edges(query))
+
+
+@audit_check("Interesting privileges for domain users or computers", "relations", ["Group", "Relation", "Target", "Kind of Target"])
+def domain_users_privileges(domsid, index):
+    return _privileges([f"{domsid}-{RID.DOMAIN_USERS}", f"{domsid}-{RID.DOMAIN_COMPUTERS}"], "Group", index)
+
+
+@audit_check("Interesting privileges for guests", "relations", ["Guest Object", "Relation", "Target", "Kind of Target"])
+def guest_privileges(domsid, index):
+    return _privileges([f"{domsid}-{RID.GUEST}"], "User", index)
+
+
+@audit_check("Kerberoastable user accounts of high value (enabled, no MSA/gMSA)", "accounts", ["Account"], tags=["admin_tier_0"])
+def kerberoastable_users(domsid, index):
+    result = api.users(domainsid=domsid, hasspn=True, enabled=True)
+    return sorted(
+        (n["properties"]["name"],)
+        for n in result
+        if "admin_tier_0" in n["properties"].get("system_tags", "")
+        and not n["properties"].get("msa", False)
+        and not n["properties"].get("gmsa", False)
+    )
+
+
+@audit_check("AS-REP-roastable user accounts (enabled)", "accounts", ["Account"])
+def asreproastable_users(domsid, index):
+    result = api.users(domainsid=domsid, dontreqpreauth=True, enabled=True, include_properties=False)
+    return sorted((n["label"],) for n in result)
+
+
+@audit_check("Accounts trusted for unconstrained delegation (enabled, no DCs)", "accounts", ["Account"])
+def unconstrained_delegation(domsid, index):
+    if index is not None:
+        query = f"""MATCH (n)
+                {cypher.where("n", domainsid=domsid, unconstraineddelegation=True, enabled=True)}
+                AND NOT n.objectid IN {cypher.escape(index.members(f"{domsid}-{RID.DOMAIN_CONTROLLERS}"))}
+                RETURN n
+                """
+    else:
         query = f"""MATCH (dc)-[:MemberOf*1..]->(g:Group)
                 {cypher.where("g", objectid=f"{domsid}-{RID.DOMAIN_CONTROLLERS}")}
                 WITH COLLECT(dc) AS exclude
@@ -119,26 +194,207 @@ def audit(domain):
                 AND NOT n IN exclude
                 RETURN n
                 """
-        result = api.cypher(query)["nodes"].values()
-        count = len(result)
-        print(f"    {count} accounts found")
-        result = sorted(n["properties"]["name"] for n in result)
-        for n in result:
-            print(n)
-        print()
-
-        print("[*] Computers with unsupported operating systems (enabled)")
-        query = f"""MATCH (c:Computer)
-                {cypher.where("c", domainsid=domsid, enabled=True)}
-                AND c.operatingsystem =~ '(?i).*Windows.* (2000|2003|2008|2012|xp|vista|7|8|me|nt).*'
-                RETURN c
-                """
-        result = api.cypher(query)["nodes"].values()
-        count = len(result)
-        print(f"    {count} computers found")
-        result = sorted((n["properties"]["operatingsystem"], n["properties"]["name"]) for n in result)
-        for n in result:
-            print(f"{n[1]} ({n[0]})")
-        print()
-
-        print()
+    result = api.cypher(query, include_properties=False)["nodes"].values()
+    return sorted((n["label"],) for n in result)
+
+
+@audit_check("Computers with unsupported operating systems (enabled)", "computers", ["Operating System", "Computer"], line="{1} ({0})")
+def unsupported_os(domsid, index):
+    query = f"""MATCH (c:Computer)
+            {cypher.where("c", domainsid=domsid, enabled=True)}
+            AND c.operatingsystem =~ '(?i).*Windows.* (2000|2003|2008|2012|xp|vista|7|8|me|nt).*'
+            RETURN c
+            """
+    result = api.cypher(query)["nodes"].values()
+    return sorted((n["properties"]["operatingsystem"], n["properties"]["name"]) for n in result)
+
+
+def _by_domain(rows):
+    """Return a dict mapping domain SIDs to sorted lists of rows from (domain SID, row) tuples."""
+
+    result = {}
+    for domsid, row in rows:
+        result.setdefault(domsid, []).append(row)
+    return {domsid: sorted(set(rows)) for domsid, rows in result.items()}
+
+
+@audit_check("Principals with ADCS escalation relations to the domain", "relations", ["Principal", "Relation", "Kind of Principal"], batched=True)
+def adcs_escalations(domsids, index):
+    query = f"""MATCH p=(n)-[r{cypher.relationship_types(adcs_relations)}]->(d:Domain)
+            {cypher.where("d", comparison_operator="IN", objectid=domsids)}
+            RETURN p
+            """
+    edges = api.cypher_edges(query)
+    return _by_domain((target["objectId"], (source["label"], edge["label"], source["kind"])) for source, edge, target in edges)
+
+
+def _domain_sid(node):
+    """Return the SID of the domain an object belongs to, taken from the domain part of its label (NAME@DOMAIN).
+
+    This allows batched queries to skip the node properties.
+    """
+
+    entry = api.domain_directory().get(node["label"].rpartition("@")[2])
+    return entry["id"] if entry is not None else None
+
+
+@audit_check("Published certificate templates allowing enrollees to supply the subject for authentication (ESC1)", "templates", ["Template", "Enterprise CA"], batched=True)
+def adcs_esc1_templates(domsids, index):
+    conditions = cypher.conditions(
+        "t",
+        enrolleesuppliessubject=True,
+        authenticationenabled=True,
+        requiresmanagerapproval=False,
+        authorizedsignatures=0,
+    ) + cypher.conditions("t", comparison_operator="IN", domainsid=domsids)
+    query = f"""MATCH p=(t:CertTemplate)-[:PublishedTo]->(ca:EnterpriseCA)
+            WHERE {" AND ".join(conditions)}
+            RETURN p
+            """
+    edges = api.cypher_edges(query)
+    return _by_domain((_domain_sid(template), (template["label"], ca["label"])) for template, _, ca in edges)
+
+
+ca_issues = {
+    "isuserspecifiessanenabled": "Requesters may specify a SAN via EDITF_ATTRIBUTESUBJECTALTNAME2 (ESC6)",
+    "hasvulnerableendpoint": "Web enrollment endpoint vulnerable to NTLM relay (ESC8)",
+}
+
+
+@audit_check("Enterprise CAs with vulnerable configuration", "issues", ["Enterprise CA", "Issue"], batched=True)
+def adcs_vulnerable_cas(domsids, index):
+    return _by_domain(
+        (_domain_sid(ca), (ca["label"], issue))
+        for flag, issue in ca_issues.items()
+        for ca in api.enterprise_cas(domainsid=domsids, include_properties=False, **{flag: True})
+    )
+
+
+def asset_group_state(tags):
+    """Return a hash of the selectors per asset group tag, which changes whenever objects are (un)marked."""
+
+    selectors = {tag: [] for tag in tags}
+    for asset_group in api.get_asset_groups():
+        if asset_group["tag"] in selectors:
+            selectors[asset_group["tag"]] = sorted(selector["selector"] for selector in asset_group.get("Selectors") or [])
+    return {
+        tag: hashlib.sha256("\n".join(sids).encode()).hexdigest()
+        for tag, sids in selectors.items()
+    }
+
+
+def write_finding(out, dom, check, status, row):
+    """Write a finding with the fixed fields of the output, followed by the fields of the check for JSON."""
+
+    values = (dom, check.name) + status + (check.format_row(row),)
+    if out.format in ("json", "ndjson"):
+        out.write(values + row, out.fields + check.keys)
+    else:
+        out.write(values)
+
+
+@click.command()
+@click.option("--domain", "-d", type=DomainType(), help="Audit specific domain only.")
+@click.option("--incremental", "-i", is_flag=True, help="Reuse results of the last audit if no data was ingested since then, otherwise show changes.")
+@click.option("--index", "use_index", is_flag=True, help="Resolve group memberships from a local index instead of server-side traversals.")
+@format_option(default="table")
+@fan_out
+def audit(domain, incremental, use_index, output_format):
+    """Audit domains for potential security issues.
+
+    With --incremental, the results are stored locally together with the time of the last completed ingest.
+    When auditing again, checks are only re-evaluated if new data was ingested in the meantime,
+    or objects were marked in an asset group a check depends on (e.g. admin_tier_0),
+    and findings that are new or gone since the last audit are shown.
+
+    With --index, all group memberships are fetched once and stored as local index,
+    which is reused until new data is ingested. This is much faster for deeply nested groups.
+
+    Formats other than table output one finding per row, labeled with domain and check name
+    and, with --incremental, a status which is either new, unchanged or removed.
+    The finding is given as a single line, JSON objects additionally contain its fields.
+    """
+
+    domains = selected_domains(domain)
+
+    last_ingest = None
+    tag_state = {}
+    previous_results = {}
+    if incremental:
+        last_ingest = api.last_ingest()
+        tag_state = asset_group_state({tag for check in checks for tag in check.tags})
+        previous_results = state.load("audit", api.url, default={})
+
+    index = MembershipIndex.fetch(api) if use_index else None
+
+    def reusable(domsid, check):
+        """Return whether the previous results of a check for a domain are still up to date."""
+
+        previous = previous_results.get(domsid, {})
+        previous_tags = previous.get("tags", {})
+        return incremental and last_ingest is not None and previous.get("ingest") == last_ingest \
+            and check.name in previous.get("checks", {}) \
+            and all(previous_tags.get(tag) == tag_state[tag] for tag in check.tags)
+
+    out = None
+    if output_format != "table":
+        out = Output(["domain", "check"] + (["status"] if incremental else []) + ["finding"], output_format)
+
+    # batched checks are evaluated once for all domains that need re-evaluation
+    batched = {}
+    for check in checks:
+        if check.batched:
+            pending = [domsid for _, domsid in domains if not reusable(domsid, check)]
+            batched[check.name] = check.run_many(pending, index) if pending else {}
+
+    for dom, domsid in domains:
+        if out is None:
+            print(dom)
+            print("=" * len(dom))
+            print()
+
+        previous = previous_results.get(domsid, {})
+        previous_checks = previous.get("checks", {})
+        results = {}
+
+        for check in checks:
+            reused = reusable(domsid, check)
+            if reused:
+                log.debug("No new data ingested or objects marked, reusing previous results of check %s", check.name)
+                rows = [tuple(row) for row in previous_checks[check.name]]
+            elif check.batched:
+                rows = batched[check.name][domsid]
+            else:
+                rows = check.run(domsid, index)
+            results[check.name] = rows
+
+            old_rows = {tuple(row) for row in previous_checks.get(check.name, [])}
+            added = set(rows) - old_rows
+            removed = old_rows - set(rows)
+
+            if out is not None:
+                for row in rows:
+                    status = ("new" if row in added else "unchanged",) if incremental else ()
+                    write_finding(out, dom, check, status, row)
+                for row in sorted(removed) if incremental else []:
+                    write_finding(out, dom, check, ("removed",), row)
+                continue
+
+            check.print(rows)
+            if incremental and not reused and check.name in previous_checks:
+                print(f"    Changes since last audit: {len(added)} new, {len(removed)} removed")
+                for row in sorted(added):
+                    print(f"    + {check.format_row(row)}")
+                for row in sorted(removed):
+                    print(f"    - {check.format_row(row)}")
+            print()
+
+        if incremental:
+            previous_results[domsid] = {"ingest": last_ingest, "tags": tag_state, "checks": results}
+            state.save("audit", api.url, previous_results)
+
+        if out is None:
+            print()
+
+    if out is not None:
+        out.close()
@@ -14,6 +14,7 @@ def auth(url, username, password):
 
     The argument URL is the base URL of the BloodHound API server.
     Username and password will be prompted for when not specified.
+    The token is stored in the profile given with 'bhcli --profile NAME auth ...', by default in the default profile.
     """
 
     if not url.startswith("http://") and not url.startswith("https://"):
@@ -28,6 +29,6 @@ def auth(url, username, password):
     api = Api(url, bearer=result["session_token"])
     result = api.create_token(token_name, result["user_id"])
 
-    log.info("Storing API token to config file: %s", config.config_file)
+    log.info("Storing API token for profile %s to config file: %s", config.profile, config.config_file)
     config.update(url=url, token_id=result["id"], token_key=result["key"])
     log.info("bhcli is now configured and ready to access the API.")
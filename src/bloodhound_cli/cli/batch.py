@@ -0,0 +1,109 @@
+import collections
+import concurrent.futures
+import json
+import shlex
+import sys
+
+import click
+
+from bloodhound_cli.logger import log
+from .runner import cancel_on_interrupt, captured_stdout, run_command
+
+
+SEQUENTIAL_COMMANDS = {"auth", "batch", "export", "exposure", "generate", "mark", "queries", "upload"}
+"""Commands that modify data, start worker processes or write large local outputs and are thus not run concurrently with other operations."""
+
+REFUSED_COMMANDS = {"daemon", "watch"}
+"""Commands that run until interrupted or start background processes and are thus not run in a batch at all."""
+
+
+def parse_operations(f):
+    """Yield (id, arguments) tuples of operations read from a batch file.
+
+    Each line is either a command line like 'users -d contoso.com' or a JSON object like
+    {"id": "da", "args": ["members", "DOMAIN ADMINS@CONTOSO.COM"]}, where args can also be a command line string.
+    Empty lines and lines starting with # are ignored. The id defaults to the line number.
+    """
+
+    for number, line in enumerate(f, start=1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        op_id = number
+        if line.startswith("{"):
+            try:
+                operation = json.loads(line)
+                op_id = operation.get("id", number)
+                args = operation["args"]
+            except (ValueError, KeyError) as e:
+                log.error("Invalid operation in line %d: %s", number, e)
+                sys.exit(1)
+            if isinstance(args, str):
+                args = shlex.split(args)
+        else:
+            args = shlex.split(line)
+        if args and args[0] == "bhcli":
+            args = args[1:]
+        yield op_id, [str(arg) for arg in args]
+
+
+@click.command()
+@click.argument("file", type=click.Path(exists=True, dir_okay=False, allow_dash=True))
+@click.option("--jobs", "-j", metavar="NUM", type=click.IntRange(min=1), default=4, show_default=True, help="Number of operations run concurrently.")
+@click.pass_context
+def batch(ctx, file, jobs):
+    """Run many operations in a single session.
+
+    Reads operations from FILE (use '-' for stdin), one per line, either as command line (e.g. 'users -d contoso.com')
+    or as JSON object with an optional id and the arguments (e.g. {"id": "da", "args": ["members", "DOMAIN ADMINS@CONTOSO.COM"]}).
+
+    All operations share one connection pool to the server. Read-only operations are run concurrently,
+    while operations modifying data (auth, mark, queries, upload) or using many local resources (export, exposure, generate)
+    wait for all previous operations and run on their own. The daemon and watch commands are refused.
+    For each operation, a JSON line with id, arguments, exit code and output is printed in the order of the input.
+    """
+
+    group = ctx.find_root().command
+    failed = 0
+
+    def emit(op_id, args, result):
+        nonlocal failed
+        exit_code, output, error = result
+        record = {"id": op_id, "args": args, "exit_code": exit_code, "output": output}
+        if error is not None:
+            record["error"] = error
+        if exit_code != 0:
+            failed += 1
+        sys.stdout.write(json.dumps(record) + "\n")
+        sys.stdout.flush()
+
+    with click.open_file(file, mode="r", encoding="UTF-8") as f, captured_stdout() as stream:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor, cancel_on_interrupt():
+            pending = collections.deque()
+
+            def emit_pending(wait):
+                while pending and (wait or pending[0][2].done()):
+                    op_id, args, future = pending.popleft()
+                    emit(op_id, args, future.result())
+
+            for op_id, args in parse_operations(f):
+                command = group.get_command(ctx, args[0]) if args else None
+                if command is None:
+                    emit_pending(wait=True)
+                    emit(op_id, args, (2, "", f"Unknown command: {' '.join(args)}"))
+                    continue
+                if command.name in REFUSED_COMMANDS:
+                    emit_pending(wait=True)
+                    emit(op_id, args, (2, "", f"Command cannot be run in a batch: {command.name}"))
+                    continue
+                if command.name in SEQUENTIAL_COMMANDS:
+                    emit_pending(wait=True)
+                    emit(op_id, args, run_command(command, args[1:], stream))
+                else:
+                    pending.append((op_id, args, executor.submit(run_command, command, args[1:], stream)))
+                    emit_pending(wait=False)
+            emit_pending(wait=True)
+
+    if failed:
+        log.error("%d operations failed.", failed)
+        sys.exit(1)
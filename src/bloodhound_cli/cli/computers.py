@@ -1,10 +1,9 @@
-import sys
-
 import click
 
 from bloodhound_cli.api.from_config import api
-from bloodhound_cli.logger import log
-from .paramtypes import DomainType
+from .output import format_option, write_nodes
+from .paramtypes import DomainType, domain_sid
+from .profiles import fan_out
 
 
 @click.command()
@@ -16,49 +15,25 @@ from .paramtypes import DomainType
 @click.option("--description", is_flag=True, help="Show description.")
 @click.option("--sep", "-s", metavar="SEP", default="\t", help="Separator between fields (default: tab).")
 @click.option("--skip-empty", is_flag=True, help="Skip entry when one field is empty.")
-def computers(domain, enabled, owned, sam, pre_win2k_pw, description, sep, skip_empty):
+@click.option("--jobs", "-j", metavar="NUM", type=click.IntRange(min=1), default=1, show_default=True, help="Number of partitions fetched concurrently.")
+@format_option()
+@fan_out
+def computers(domain, enabled, owned, sam, pre_win2k_pw, description, sep, skip_empty, jobs, output_format):
     """Get lists of computers."""
 
-    domainsid = None
-    if domain:
-        try:
-            domainsid = [d["id"] for d in api.domains() if d["name"] == domain.upper()][0]
-        except IndexError:
-            log.error("Unknown domain %s.", domain)
-            sys.exit(1)
+    domainsid = domain_sid(domain)
+
+    result = api.computers(domainsid=domainsid, enabled=enabled, partitions=jobs,
+                           key=lambda c: (c["properties"].get("domain", "").upper(), (c["properties"].get("name", ""))))
 
-    result = api.computers(domainsid=domainsid, enabled=enabled)
-    result = sorted(result, key=lambda c: (c["properties"].get("domain", "").upper(), (c["properties"].get("name", ""))))
+    if owned is not None:
+        result = (c for c in result if owned == ("owned" in c["properties"].get("system_tags", "").split()))
 
-    for computer in result:
-        props = computer["properties"]
-        if owned is not None:
-            is_owned = "owned" in props.get("system_tags", "").split()
-            if owned != is_owned:
-                continue
-        try:
-            out = [props["name"]]
-        except KeyError:
-            continue
-        if sam:
-            try:
-                out.append(props["samaccountname"])
-            except KeyError:
-                if skip_empty:
-                    continue
-                out.append("")
-        if pre_win2k_pw:
-            try:
-                out.append(props["samaccountname"].strip().rstrip("$").lower()[:14])
-            except KeyError:
-                if skip_empty:
-                    continue
-                out.append("")
-        if description:
-            try:
-                out.append(props["description"])
-            except KeyError:
-                if skip_empty:
-                    continue
-                out.append("")
-        print(sep.join(out))
+    columns = []
+    if sam:
+        columns.append("samaccountname")
+    if pre_win2k_pw:
+        columns.append(("pre_win2k_pw", lambda props: props["samaccountname"].strip().rstrip("$").lower()[:14]))
+    if description:
+        columns.append("description")
+    write_nodes(result, columns, output_format, sep, skip_empty)
@@ -1,15 +1,21 @@
 import json
+import sys
 
 import click
 
+from bloodhound_cli.api import codec
 from bloodhound_cli.api.from_config import api
 
 
 @click.command()
 @click.argument("query")
 @click.option("--no-properties", "properties", flag_value=False, default=True, help="Don't return all node properties.")
-def cypher(query, properties):
+@click.option("--compact", is_flag=True, help="Print compact JSON on a single line, which is much faster for large results.")
+def cypher(query, properties, compact):
     """Run a raw Cypher query and print the response as JSON."""
 
     result = api.cypher(query, include_properties=properties)
-    print(json.dumps(result, indent=4))
+    if compact:
+        sys.stdout.write(codec.dumps(result).decode() + "\n")
+    else:
+        print(json.dumps(result, indent=4))
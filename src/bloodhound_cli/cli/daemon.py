@@ -0,0 +1,95 @@
+import datetime
+import os
+import subprocess
+import sys
+import time
+
+import click
+
+from bloodhound_cli import daemon as bhcli_daemon
+from bloodhound_cli import state
+from bloodhound_cli.logger import log
+
+
+def _status():
+    """Return the status of the running daemon, or None if it is not running."""
+
+    try:
+        return bhcli_daemon.request({"command": "status"}, timeout=5)
+    except OSError:
+        return None
+
+
+@click.group()
+def daemon():
+    """Run commands in a warm background process.
+
+    While the daemon is running, read commands (audit, computers, cypher, domains, exposure, groups,
+    members, paths, stats, users) and shell completions are transparently forwarded to it.
+    The daemon keeps the configuration, connections to the servers and caches like the domain directory,
+    so these commands return without the startup time of a new process.
+    Set BHCLI_NO_DAEMON to always run commands locally.
+    """
+
+
+@daemon.command()
+def start():
+    """Start the daemon in the background."""
+
+    status = _status()
+    if status is not None:
+        log.info("Daemon is already running with PID %d.", status["pid"])
+        return
+
+    log_file = os.path.join(state.state_dir(), "daemon.log")
+    os.makedirs(state.state_dir(), mode=0o700, exist_ok=True)
+    with open(log_file, "a", encoding="UTF-8") as f:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "bloodhound_cli", "daemon", "run"],
+            stdin=subprocess.DEVNULL,
+            stdout=f,
+            stderr=f,
+            start_new_session=True,
+        )
+
+    for _ in range(100):
+        status = _status()
+        if status is not None:
+            log.info("Daemon started with PID %d.", status["pid"])
+            return
+        if process.poll() is not None:
+            break
+        time.sleep(0.1)
+    log.error("Could not start the daemon, see %s for details.", log_file)
+    sys.exit(1)
+
+
+@daemon.command()
+def stop():
+    """Stop the daemon."""
+
+    try:
+        response = bhcli_daemon.request({"command": "stop"}, timeout=5)
+    except OSError:
+        log.info("Daemon is not running.")
+        return
+    log.info("Stopped daemon with PID %d.", response["pid"])
+
+
+@daemon.command()
+def status():
+    """Show whether the daemon is running."""
+
+    status = _status()
+    if status is None:
+        print("not running")
+        sys.exit(3)
+    started = datetime.datetime.fromtimestamp(status["started"]).astimezone().isoformat(timespec="seconds")
+    print(f"running (PID {status['pid']}, started {started}, {status['requests']} requests)")
+
+
+@daemon.command(hidden=True)
+def run():
+    """Run the daemon in the foreground."""
+
+    bhcli_daemon.Daemon().serve()
@@ -1,20 +1,23 @@
 import click
 
 from bloodhound_cli.api.from_config import api
+from .output import Output, format_option
+from .profiles import fan_out
 
 
 @click.command()
 @click.option("--collected/--not-collected", default=None, help="Show only (not) collected domains.")
 @click.option("--sid", is_flag=True, help="Show SIDs.")
 @click.option("--sep", "-s", metavar="SEP", default="\t", help="Separator between fields (default: tab).")
-def domains(collected, sid, sep):
+@format_option()
+@fan_out
+def domains(collected, sid, sep, output_format):
     """Get lists of domains."""
 
     result = api.domains(collected=collected)
     result = sorted(result, key=lambda d: d["name"])
 
-    for domain in result:
-        out = [domain["name"]]
-        if sid:
-            out.append(domain["id"])
-        print(sep.join(out))
+    fields = ["name", "sid"] if sid else ["name"]
+    with Output(fields, output_format, sep) as out:
+        for domain in result:
+            out.write([domain["name"], domain["id"]] if sid else [domain["name"]])
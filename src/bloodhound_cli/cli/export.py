@@ -0,0 +1,63 @@
+import collections
+import os
+import sys
+
+import click
+
+from bloodhound_cli.api.from_config import api
+from bloodhound_cli.export import FORMATS, GraphExport, edge_record, node_record, pyarrow
+from bloodhound_cli.logger import log
+
+
+@click.command()
+@click.argument("directory", type=click.Path(file_okay=False))
+@click.option("--format", "file_format", type=click.Choice(FORMATS, case_sensitive=False), help="File format of the parts (default: parquet if pyarrow is installed, otherwise csv).")
+@click.option("--page-size", metavar="NUM", type=click.IntRange(min=1), default=10000, show_default=True, help="Number of nodes, or of nodes whose outgoing edges are, fetched per request.")
+@click.option("--resume", is_flag=True, help="Resume an interrupted export in DIRECTORY.")
+def export(directory, file_format, page_size, resume):
+    """Export the whole graph to compact files for offline analysis.
+
+    Pages through all nodes and edges and writes them into DIRECTORY, one part file per page
+    and per node kind or edge type, either as Parquet (requires pyarrow) or as CSV.
+    A schema.json file lists the columns of each kind with their types.
+
+    The progress is recorded after each page, so an interrupted export can be continued with --resume.
+    """
+
+    if resume and not GraphExport.exists(directory):
+        log.error("No export to resume found in %s.", directory)
+        sys.exit(1)
+    if not resume and GraphExport.exists(directory):
+        log.error("Directory %s already contains an export. Use --resume to continue it or choose another directory.", directory)
+        sys.exit(1)
+    if file_format == "parquet" and pyarrow is None:
+        log.error("Writing Parquet files requires pyarrow to be installed.")
+        sys.exit(1)
+
+    os.makedirs(directory, exist_ok=True)
+    graph_export = GraphExport(directory, file_format=file_format, resume=resume)
+    nodes = graph_export.checkpoint["nodes"]
+    edges = graph_export.checkpoint["edges"]
+
+    if not nodes["done"]:
+        log.info("Exporting nodes as %s...", graph_export.format)
+        for page in api.iter_nodes(after_id=nodes["after_id"], page_size=page_size):
+            records = collections.defaultdict(list)
+            for node_id, node in page:
+                records[node["kind"]].append(node_record(node_id, node))
+            graph_export.write_page("nodes", records, len(page), after_id=page[-1][0])
+            log.info("Exported %d nodes.", nodes["count"])
+        graph_export.finish("nodes")
+
+    if not edges["done"]:
+        log.info("Exporting edges as %s...", graph_export.format)
+        # edge properties are needed, which the server only returns together with those of the nodes
+        for page in api.iter_edges(after_id=edges["after_id"], page_size=page_size):
+            records = collections.defaultdict(list)
+            for source, edge, target in page:
+                records[edge["kind"]].append(edge_record(edge, source, target))
+            graph_export.write_page("edges", records, len(page), after_id=int(page[-1][1]["source"]))
+            log.info("Exported %d edges.", edges["count"])
+        graph_export.finish("edges")
+
+    log.info("Exported %d nodes and %d edges to %s", nodes["count"], edges["count"], directory)
@@ -0,0 +1,70 @@
+import collections
+import sys
+
+import click
+
+from bloodhound_cli.api.from_config import api
+from bloodhound_cli.exposure import ExposureGraph
+from bloodhound_cli.logger import log
+from .audit import boring_relations
+from .output import Output, format_option
+from .paths import resolve_selector
+
+
+@click.command()
+@click.option("--from", "-f", "sources", metavar="SELECTOR", multiple=True, help="Start nodes to rank (can be given multiple times, default: all users, computers and groups that can reach an end node).")
+@click.option("--to", "-t", "targets", metavar="SELECTOR", multiple=True, default=["tag:admin_tier_0"], show_default=True, help="End nodes (can be given multiple times).")
+@click.option("--exclude-rel", "exclude_relations", metavar="TYPE", multiple=True, help="Do not follow relations of this type (can be given multiple times).")
+@click.option("--exclude-boring", is_flag=True, help=f"Do not follow relations considered boring by the audit ({', '.join(r for r in boring_relations if r != 'MemberOf')}).")
+@click.option("--jobs", "-j", metavar="NUM", type=click.IntRange(min=1), help="Number of worker processes (default: number of CPUs).")
+@click.option("--top", metavar="NUM", type=click.IntRange(min=1), help="Only show the highest ranked start nodes.")
+@format_option()
+def exposure(sources, targets, exclude_relations, exclude_boring, jobs, top, output_format):
+    """Rank objects by their exposure to tier zero.
+
+    All relations are fetched once per ingest and analyzed locally. For each start node, the report shows
+    the number of hops to the nearest end node (empty if there is no path), the number of objects
+    reachable from it (its blast radius) and how many of them are end nodes.
+    Start nodes are ranked by reachable end nodes, then by blast radius.
+
+    Selectors are given as for the paths subcommand, by default the exposure to tier zero objects is analyzed.
+    """
+
+    exclude_relations = list(exclude_relations)
+    if exclude_boring:
+        exclude_relations += [r for r in boring_relations if r != "MemberOf"]
+
+    target_sids = {node["objectId"] for selector in targets for node in resolve_selector(selector)}
+    if not target_sids:
+        log.error("No end nodes found for: %s", ", ".join(targets))
+        sys.exit(1)
+
+    graph = ExposureGraph.fetch(api, exclude_relations)
+    distances = graph.distances_to(target_sids)
+    exposed = [
+        sid for (sid, _, kind), distance in zip(graph.nodes, distances)
+        if distance > 0 and kind in ("User", "Computer", "Group")
+    ]
+    by_kind = collections.Counter(graph.kind(sid) for sid in exposed)
+    log.info("%d principals can reach an end node%s.", len(exposed),
+             f" ({', '.join(f'{kind}: {num}' for kind, num in sorted(by_kind.items()))})" if exposed else "")
+
+    if sources:
+        start_sids = {node["objectId"] for selector in sources for node in resolve_selector(selector)}
+        start_sids = [sid for sid in start_sids if sid in graph]
+        if not start_sids:
+            log.error("No start nodes with relations found for: %s", ", ".join(sources))
+            sys.exit(1)
+    else:
+        start_sids = exposed
+
+    log.info("Computing blast radius of %d start nodes...", len(start_sids))
+    hops = {sid: distance for (sid, _, _), distance in zip(graph.nodes, distances)}
+    report = sorted(
+        graph.reach(start_sids, target_sids, processes=jobs),
+        key=lambda r: (-r[2], -r[1], graph.label(r[0])),
+    )
+
+    with Output(["name", "kind", "hops", "reach", "targets"], output_format) as out:
+        for sid, reached, reached_targets in report[:top]:
+            out.write([graph.label(sid), graph.kind(sid), hops[sid] if hops[sid] >= 0 else None, reached, reached_targets])
@@ -0,0 +1,26 @@
+import click
+
+from bloodhound_cli.generate import Dataset, write_files
+from bloodhound_cli.logger import log
+
+
+@click.command()
+@click.argument("directory", type=click.Path(file_okay=False))
+@click.option("--principals", "-n", metavar="NUM", type=click.IntRange(min=3), default=10000, show_default=True, help="Number of users, computers and groups to generate.")
+@click.option("--domain", "-d", metavar="DOMAIN", default="CONTOSO.COM", show_default=True, help="Name of the generated domain.")
+@click.option("--seed", metavar="SEED", type=int, default=0, show_default=True, help="Seed for the random generator.")
+@click.option("--memberships", metavar="NUM", type=click.FloatRange(min=0), default=3, show_default=True, help="Average number of groups per user and computer.")
+@click.option("--acl-density", metavar="PROB", type=click.FloatRange(min=0, max=0.9), default=0.05, show_default=True, help="Probability of additional random ACEs per object.")
+@click.option("--zip", "compress", is_flag=True, help="Bundle the files into a single ZIP file.")
+def generate(directory, principals, domain, seed, memberships, acl_density, compress):
+    """Generate a synthetic dataset in the collector format.
+
+    Writes JSON files as produced by SharpHound into DIRECTORY, which can be ingested with the upload subcommand.
+    The dataset contains nested group memberships and ACL edges and is reproducible for a given seed.
+    Files are written as a stream, so even millions of principals can be generated with constant memory.
+    """
+
+    dataset = Dataset(domain=domain, principals=principals, seed=seed, memberships=memberships, acl_density=acl_density)
+    log.info("Generating %d users, %d computers and %d groups in domain %s...", dataset.num_users, dataset.num_computers, dataset.num_groups, dataset.domain)
+    for path in write_files(dataset, directory, compress=compress):
+        log.info("Wrote file %s", path)
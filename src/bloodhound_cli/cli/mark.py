@@ -11,15 +11,20 @@ from .paramtypes import AssetGroupTagType
 @click.argument("tag", type=AssetGroupTagType())
 @click.argument("objects", metavar="[OBJECT]...", nargs=-1)
 @click.option("--file", "-f", type=click.Path(exists=True, dir_okay=False, allow_dash=True), help="File containing object names to mark (use '-' for stdin).")
+@click.option("--sync", is_flag=True, help="Also remove objects from the asset group which are not given.")
 @click.option("--create-asset-group", metavar="NAME", type=str, help="Create the asset group with specified pretty name if it does not exist.")
-def mark(tag, objects, file, create_asset_group):
+def mark(tag, objects, file, sync, create_asset_group):
     """Mark objects as belonging to an asset group.
 
     The first argument is the tag of the asset group the objects should be added to (e.g. 'owned' or 'admin_tier_0').
 
     The full BloodHound label must be given as the object name.
     Only User and Computer objects are supported for now.
-    If the name contains an '@', it is treated as a User, otherwise as a Computer.
+
+    With --sync, the given objects are the desired members of the asset group:
+    objects that are not given are removed from it, so a continuously updated list can be applied repeatedly.
+    Nothing is changed if any of the given objects cannot be found.
+    Only the differences to the current members are sent to the server.
     """
 
     asset_groups = api.get_asset_groups(tag=tag)
@@ -33,36 +38,46 @@ def mark(tag, objects, file, create_asset_group):
             sys.exit(1)
     asset_group_id = asset_groups[0]["id"]
 
-    names_to_add = list(objects)
+    selectors = asset_groups[0].get("Selectors") or []
+    marked_sids = {selector["selector"] for selector in selectors}
+    # selectors added by BloodHound itself cannot be removed
+    removable_sids = {selector["selector"] for selector in selectors if not selector.get("system_selector")}
+
+    names = list(objects)
 
     if file:
         with click.open_file(file, mode="r", encoding="UTF-8") as f:
             for line in f.readlines():
                 line = line.strip()
                 if line:
-                    names_to_add.append(line)
+                    names.append(line)
 
-    sids_to_add = set()
-
-    for obj in names_to_add:
-        if "@" in obj:
-            kind = "User"
-        else:
-            kind = "Computer"
-        result = api.search(obj, kind)
-        result = [x for x in result if x["name"].upper() == obj.upper()]
-        if len(result) < 1:
-            log.warning("No %s object found with name: %s", kind, obj)
+    names = {name.upper() for name in names}
+    found = {}
+    for obj in api.objects_by_name(names, kinds=["User", "Computer"]):
+        if obj["label"] in found:
+            log.warning("This should not happen! Found more than one object with name: %s", obj["label"])
             continue
-        if len(result) > 1:
-            log.warning("This should not happen! Found more than one %s object with name: %s", kind, obj)
-            continue
-        result = result[0]
-        if tag in result.get("system_tags", "").split() or tag in result.get("user_tags", "").split():
-            log.warning("%s object is already marked as %s: %s", kind, tag, result["name"])
-            continue
-        sids_to_add.add(result["objectid"])
+        found[obj["label"]] = obj["objectId"]
+    not_found = sorted(names - found.keys())
+    for name in not_found:
+        log.warning("No User or Computer object found with name: %s", name)
+    if sync and not_found:
+        # the objects might still be marked, removing them cannot be told apart from removing wanted ones
+        log.error("Not synchronizing asset group %s, %d objects could not be found.", tag, len(not_found))
+        sys.exit(1)
+
+    desired_sids = set(found.values())
+    sids_to_add = desired_sids - marked_sids
+    sids_to_remove = removable_sids - desired_sids if sync else set()
+    if not sync:
+        for name, sid in sorted(found.items()):
+            if sid in marked_sids:
+                log.warning("Object is already marked as %s: %s", tag, name)
 
+    if sids_to_add or sids_to_remove:
+        api.update_asset_group_selectors(asset_group_id, add=sorted(sids_to_add), remove=sorted(sids_to_remove))
     if sids_to_add:
-        api.add_to_asset_group(asset_group_id, list(sids_to_add))
         log.info("Marked %d objects as %s.", len(sids_to_add), tag)
+    if sids_to_remove:
+        log.info("Unmarked %d objects as %s.", len(sids_to_remove), tag)
@@ -3,45 +3,104 @@ import sys
 import click
 
 from bloodhound_cli.api.from_config import api
+from bloodhound_cli.constants import RID
 from bloodhound_cli.logger import log
+from bloodhound_cli.membership import MembershipIndex
+from .output import Output, format_option, write_nodes
 from .paramtypes import GroupType
 
 
+def read_group_names(file):
+    """Return the group names listed in a file, one per line, ignoring empty lines and comments."""
+
+    with click.open_file(file, mode="r", encoding="UTF-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.strip().startswith("#")]
+
+
+def parse_rids(names):
+    """Return the RID constants for names like domain_admins, or exit with an error for unknown names."""
+
+    rids = []
+    for name in names:
+        try:
+            rids.append(RID[name.upper()])
+        except KeyError:
+            log.error("Unknown RID name %s, use one of: %s", name, ", ".join(r.name.lower() for r in RID))
+            sys.exit(1)
+    return rids
+
+
 @click.command()
-@click.argument("group", type=GroupType())
+@click.argument("groups", metavar="[GROUP]...", nargs=-1, type=GroupType())
+@click.option("--file", "-f", "file", type=click.Path(exists=True, dir_okay=False, allow_dash=True), help="Read group names from a file, one per line (use '-' for stdin).")
+@click.option("--rid", "rids", metavar="NAME", multiple=True, help="Select the groups with a well-known RID in all domains, e.g. domain_admins (can be given multiple times).")
 @click.option("--indirect", "-i", is_flag=True, help="Include indirect members and hide groups in output.")
 @click.option("--enabled/--disabled", default=None, help="Show only enabled/disabled members.")
 @click.option("--sam", is_flag=True, help="Show SAM account name.")
 @click.option("--sep", "-s", metavar="SEP", default="\t", help="Separator between fields (default: tab).")
-def members(indirect, group, enabled, sam, sep):
+@click.option("--index", "use_index", is_flag=True, help="Resolve memberships from a local index instead of a server-side traversal.")
+@format_option()
+def members(indirect, groups, file, rids, enabled, sam, sep, use_index, output_format):
     """Get lists of group members.
 
-    The full BloodHound label must be given as the group name.
+    The full BloodHound label must be given as the group name. Several groups can be given as arguments,
+    in a file or by their well-known RID with --rid (one of: domain_admins, enterprise_admins, account_operators, ...).
+    They are all resolved in one query and their members fetched in one traversal.
+    Unless a single group is given as argument, each row is labeled with the group.
+
+    With --index, all group memberships are fetched once and stored as local index,
+    which is reused until new data is ingested. This is much faster for deeply nested groups.
     """
 
-    group_search = api.search(group, kind="Group")
-    group_search = [x for x in group_search if x["name"].upper() == group.upper()]
-    if len(group_search) < 1:
-        log.error("No group found with name: %s", group)
+    names = list(groups)
+    if file is not None:
+        names += read_group_names(file)
+    rids = parse_rids(rids)
+    if not names and not rids:
+        log.error("No group given, use arguments, --file or --rid.")
         sys.exit(1)
-    group_sid = group_search[0]["objectid"]
+    labeled = len(names) != 1 or file is not None or bool(rids)
 
-    result = api.group_members(group_sid, indirect_members=indirect)
-    result = sorted(result, key=lambda m: (m["properties"].get("domain", "").upper(), (m["properties"].get("name", ""))))
+    found = api.find_groups(names, rids)
+    found_names = {group["label"].upper() for group in found}
+    for name in names:
+        if name.upper() not in found_names:
+            log.error("No group found with name: %s", name)
+    for rid in rids:
+        if not any(group["objectId"].endswith(f"-{int(rid)}") for group in found):
+            log.warning("No group found with RID %s", rid.name.lower())
+    if not found:
+        sys.exit(1)
+    found = sorted(found, key=lambda g: g["label"])
+    group_sids = [group["objectId"] for group in found]
 
-    for member in result:
-        if indirect and member["kind"] == "Group":
-            continue
-        props = member["properties"]
-        if enabled is not None and enabled != props.get("enabled"):
-            continue
-        try:
-            out = [props["name"]]
-        except KeyError:
-            continue
-        if sam:
-            try:
-                out.append(props["samaccountname"])
-            except KeyError:
-                out.append("")
-        print(sep.join(out))
+    if use_index:
+        index = MembershipIndex.fetch(api)
+        member_sids = {sid: index.members(sid, indirect=indirect) for sid in group_sids}
+        nodes = {node["objectId"]: node for node in api.objects_by_sid({m for sids in member_sids.values() for m in sids})}
+        result = {sid: [nodes[m] for m in sids if m in nodes] for sid, sids in member_sids.items()}
+    else:
+        result = api.groups_members(group_sids, indirect_members=indirect)
+
+    def selected(group_sid):
+        selection = sorted(result[group_sid], key=lambda m: (m["properties"].get("domain", "").upper(), (m["properties"].get("name", ""))))
+        if indirect:
+            selection = (m for m in selection if m["kind"] != "Group")
+        if enabled is not None:
+            selection = (m for m in selection if enabled == m["properties"].get("enabled"))
+        return selection
+
+    columns = []
+    if sam:
+        columns.append("samaccountname")
+
+    if not labeled:
+        write_nodes(selected(group_sids[0]), columns, output_format, sep)
+        return
+
+    with Output(["group", "name"] + columns, output_format, sep) as out:
+        for group in found:
+            for member in selected(group["objectId"]):
+                props = member["properties"]
+                if "name" in props:
+                    out.write([group["label"], props["name"]] + [props.get(column, "") for column in columns])
@@ -0,0 +1,156 @@
+import csv
+import io
+import json
+import sys
+
+import click
+import prettytable
+
+
+FORMATS = ["tsv", "csv", "json", "ndjson", "table"]
+"""Supported output formats."""
+
+BUFFER_ROWS = 1000
+"""Number of rows collected before they are written to the output stream."""
+
+
+def format_option(default="tsv"):
+    """Return the --format option shared by all commands producing lists or tables."""
+
+    return click.option(
+        "--format", "output_format",
+        type=click.Choice(FORMATS, case_sensitive=False),
+        default=default,
+        show_default=True,
+        help="Output format.",
+    )
+
+
+class Output:
+    """Renderer writing rows of fields to stdout in one of the supported formats.
+
+    Except for the table format, rows are written incrementally in chunks,
+    so arbitrarily large result sets can be piped into other tools.
+    """
+
+    def __init__(self, fields, output_format="tsv", sep="\t", stream=None):
+        """Create an output for rows consisting of the given fields.
+
+        sep is only relevant for the tsv format, which is the plain format without header.
+        """
+
+        self.fields = list(fields)
+        self.format = output_format.lower()
+        self.sep = sep
+        self._stream = stream if stream is not None else sys.stdout
+        self._buffer = []
+        self._num_rows = 0
+        self._table = None
+        if self.format == "table":
+            self._table = prettytable.PrettyTable()
+            self._table.set_style(prettytable.SINGLE_BORDER)
+            self._table.align = "l"
+            self._table.field_names = self.fields
+        elif self.format == "csv":
+            self._buffer.append(self._csv_line(self.fields))
+        elif self.format == "json":
+            self._buffer.append("[")
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    @staticmethod
+    def _csv_line(values):
+        line = io.StringIO()
+        csv.writer(line, lineterminator="\n").writerow(values)
+        return line.getvalue()
+
+
+    @staticmethod
+    def _text(value):
+        if value is None:
+            return ""
+        if isinstance(value, bool):
+            return str(value).lower()
+        return str(value)
+
+
+    def write(self, row, fields=None):
+        """Write a row, given as sequence of values in the order of the fields.
+
+        fields can be given to override the field names for this row only, which
+        is useful for rows of varying structure in the tsv, json and ndjson formats.
+        """
+
+        fields = self.fields if fields is None else fields
+        if self.format == "tsv":
+            self._buffer.append(self.sep.join(self._text(v) for v in row) + "\n")
+        elif self.format == "csv":
+            self._buffer.append(self._csv_line(self._text(v) for v in row))
+        elif self.format == "json":
+            self._buffer.append(("\n" if self._num_rows == 0 else ",\n") + json.dumps(dict(zip(fields, row))))
+        elif self.format == "ndjson":
+            self._buffer.append(json.dumps(dict(zip(fields, row))) + "\n")
+        else:
+            self._table.add_row([self._text(v) for v in row])
+        self._num_rows += 1
+        if len(self._buffer) >= BUFFER_ROWS:
+            self.flush()
+
+
+    def flush(self):
+        """Write buffered rows to the output stream."""
+
+        if self._buffer:
+            self._stream.write("".join(self._buffer))
+            self._buffer = []
+        self._stream.flush()
+
+
+    def close(self):
+        """Finish the output, i.e. write remaining rows and closing brackets or the table."""
+
+        if self.format == "json":
+            self._buffer.append("\n]\n" if self._num_rows else "]\n")
+        elif self.format == "table" and self._num_rows:
+            self._buffer.append(self._table.get_string() + "\n")
+        self.flush()
+
+
+def write_nodes(nodes, columns, output_format="tsv", sep="\t", skip_empty=False):
+    """Write the name and further properties of nodes.
+
+    columns is a list of property names or (field, function) tuples where the function
+    computes the value from the properties and might raise a KeyError if it is not available.
+    Nodes without a name are skipped, as are nodes with an empty column if skip_empty is set.
+    """
+
+    getters = [("name", lambda props: props["name"])]
+    for column in columns:
+        if isinstance(column, str):
+            getters.append((column, lambda props, key=column: props[key]))
+        else:
+            getters.append(column)
+
+    with Output([field for field, _ in getters], output_format, sep) as out:
+        for node in nodes:
+            props = node["properties"]
+            try:
+                row = [props["name"]]
+            except KeyError:
+                continue
+            for _, getter in getters[1:]:
+                try:
+                    row.append(getter(props))
+                except KeyError:
+                    if skip_empty:
+                        break
+                    row.append("")
+            else:
+                out.write(row)
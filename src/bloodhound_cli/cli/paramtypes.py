@@ -1,8 +1,15 @@
+import sys
+import time
+
 from click import ParamType
 from click.shell_completion import CompletionItem
 
+from bloodhound_cli.api import TIMEOUTS
+from bloodhound_cli.api.domains import DIRECTORY_TTL, is_domain_sid
 from bloodhound_cli.api.exceptions import ApiException
 from bloodhound_cli.api.from_config import api
+from bloodhound_cli.config import config
+from bloodhound_cli.logger import log
 
 
 class AssetGroupTagType(ParamType):
@@ -26,7 +33,7 @@ class AssetGroupTagType(ParamType):
 
 
 class DomainType(ParamType):
-    """ParamType for a domain name."""
+    """ParamType for a domain given by DNS name, NetBIOS name or SID."""
 
     name = "domain"
 
@@ -34,17 +41,68 @@ class DomainType(ParamType):
         try:
             domains = [
                 domain["name"]
-                for domain in api.domains(collected=True)
+                for domain in api.domain_directory(max_age=DIRECTORY_TTL).collected()
                 if domain["name"].lower().startswith(incomplete.lower())
             ]
         except ApiException:
             return []
         return [
             CompletionItem(domain)
-            for domain in sorted(domains)
+            for domain in domains
         ]
 
 
+def resolve_domain(domain):
+    """Return the entry of a domain given as DNS name, NetBIOS name or SID, or exit with an error if it is unknown.
+
+    A recently stored domain directory is used if the domain is found in it.
+    """
+
+    entry = api.domain_directory(max_age=DIRECTORY_TTL).get(domain)
+    if entry is None:
+        entry = api.domain_directory(refresh=True).get(domain)
+    if entry is None:
+        log.error("Unknown domain %s.", domain)
+        sys.exit(1)
+    return entry
+
+
+def domain_sid(domain):
+    """Return the SID of a domain given as DNS name, NetBIOS name or SID, or None if no domain is given.
+
+    SIDs are returned as they are, without contacting the server.
+    """
+
+    if domain is None:
+        return None
+    if is_domain_sid(domain):
+        return domain.upper()
+    return resolve_domain(domain)["id"]
+
+
+def selected_domains(domain=None):
+    """Return (name, SID) tuples of the given domain or of all collected domains if none is given."""
+
+    if domain:
+        entry = resolve_domain(domain)
+        return [(entry["name"], entry["id"])]
+    return [(d["name"], d["id"]) for d in api.domain_directory().collected()]
+
+
+_group_labels = {}
+"""Labels of all groups with the time they were fetched per server URL, reused in long-running processes like the daemon."""
+
+
+def group_labels():
+    """Return the sorted labels of all groups, reusing a list fetched less than DIRECTORY_TTL seconds ago."""
+
+    fetched, labels = _group_labels.get(api.url, (0, None))
+    if labels is None or time.time() - fetched > DIRECTORY_TTL:
+        labels = sorted(group["label"] for group in api.groups(include_properties=False))
+        _group_labels[api.url] = (time.time(), labels)
+    return labels
+
+
 class GroupType(ParamType):
     """ParamType for a group name."""
 
@@ -53,13 +111,57 @@ class GroupType(ParamType):
     def shell_complete(self, ctx, param, incomplete):
         try:
             groups = [
-                group["label"]
-                for group in api.groups()
-                if group["label"].lower().startswith(incomplete.lower())
+                label
+                for label in group_labels()
+                if label.lower().startswith(incomplete.lower())
             ]
         except ApiException:
             return []
         return [
             CompletionItem(group)
-            for group in sorted(groups)
+            for group in groups
+        ]
+
+
+class ProfileType(ParamType):
+    """ParamType for the name of a profile from the configuration file."""
+
+    name = "profile"
+
+    def shell_complete(self, ctx, param, incomplete):
+        return [
+            CompletionItem(profile, help=config.get("url", profile))
+            for profile in config.profiles()
+            if profile.startswith(incomplete)
+        ]
+
+
+class TimeoutType(ParamType):
+    """ParamType for a timeout in seconds, optionally for a specific class of operations only (e.g. cypher=600).
+
+    Converts to a dict mapping the classes of operations to the timeout.
+    """
+
+    name = "timeout"
+
+    def convert(self, value, param, ctx):
+        if isinstance(value, dict):
+            return value
+        operation, _, seconds = value.rpartition("=")
+        if operation and operation not in TIMEOUTS:
+            self.fail(f"unknown class of operations '{operation}', choose from {', '.join(TIMEOUTS)}", param, ctx)
+        try:
+            seconds = float(seconds)
+        except ValueError:
+            self.fail(f"'{seconds}' is not a valid number of seconds", param, ctx)
+        if seconds <= 0:
+            self.fail("timeout must be positive", param, ctx)
+        return {operation: seconds} if operation else dict.fromkeys(TIMEOUTS, seconds)
+
+
+    def shell_complete(self, ctx, param, incomplete):
+        return [
+            CompletionItem(f"{operation}=", help=f"default: {seconds}")
+            for operation, seconds in TIMEOUTS.items()
+            if operation.startswith(incomplete)
         ]
@@ -0,0 +1,123 @@
+import sys
+from collections import deque
+
+import click
+
+from bloodhound_cli import cypher
+from bloodhound_cli.api.from_config import api
+from bloodhound_cli.constants import RID
+from bloodhound_cli.logger import log
+from .audit import boring_relations
+from .members import parse_rids
+
+
+def resolve_selector(selector):
+    """Return the nodes matching a selector.
+
+    A selector is either 'tag:TAG' for objects in an asset group, 'rid:NAME' for well-known objects
+    in all domains (e.g. 'rid:domain_admins') or the full BloodHound label of an object.
+    """
+
+    prefix, _, value = selector.partition(":")
+    pattern = "(n)"
+    if prefix == "tag" and value:
+        # tags are stored space-delimited, so match whole tokens only
+        token = cypher.escape(f" {value} ")
+        condition = (f'WHERE " " + coalesce(n.system_tags, "") + " " CONTAINS "{token}" '
+                     f'OR " " + coalesce(n.user_tags, "") + " " CONTAINS "{token}"')
+    elif prefix == "rid" and value:
+        rid = parse_rids([value])[0]
+        pattern = "(n:User)" if rid == RID.GUEST else "(n:Group)"
+        condition = f"WHERE {cypher.well_known_sid('n', rid)}"
+    else:
+        condition = cypher.where("n", name=selector.upper())
+    query = f"""MATCH {pattern}
+            {condition}
+            RETURN n
+            """
+    return api.cypher(query, include_properties=False)["nodes"].values()
+
+
+def extract_paths(graph, source_sid, target_sids):
+    """Return the paths contained in a graph from the source to the target nodes.
+
+    Each path is a list of alternating node labels and relation types.
+    """
+
+    nodes = graph["nodes"]
+    adjacency = {}
+    for edge in graph["edges"]:
+        adjacency.setdefault(edge["source"], []).append((edge["target"], edge["label"]))
+
+    start = [key for key, node in nodes.items() if node["objectId"] == source_sid]
+    if not start:
+        return []
+    start = start[0]
+
+    # breadth-first search in the union of shortest paths yields a shortest path to each target
+    parents = {start: None}
+    queue = deque([start])
+    paths = []
+    while queue:
+        current = queue.popleft()
+        if current != start and nodes[current]["objectId"] in target_sids:
+            path = [nodes[current]["label"]]
+            step = current
+            while parents[step] is not None:
+                step, relation = parents[step]
+                path = [nodes[step]["label"], relation] + path
+            paths.append(path)
+        for neighbor, relation in adjacency.get(current, []):
+            if neighbor not in parents:
+                parents[neighbor] = (current, relation)
+                queue.append(neighbor)
+    return paths
+
+
+@click.command()
+@click.option("--from", "-f", "sources", metavar="SELECTOR", multiple=True, default=["tag:owned"], show_default=True, help="Start nodes of the paths (can be given multiple times).")
+@click.option("--to", "-t", "targets", metavar="SELECTOR", multiple=True, default=["tag:admin_tier_0"], show_default=True, help="End nodes of the paths (can be given multiple times).")
+@click.option("--max-hops", metavar="NUM", type=click.IntRange(min=1), default=10, show_default=True, help="Maximum length of the paths.")
+@click.option("--limit", "-l", metavar="NUM", type=click.IntRange(min=1), default=100, show_default=True, help="Maximum number of paths per start node.")
+@click.option("--rel", "relations", metavar="TYPE", multiple=True, help="Only follow relations of this type (can be given multiple times).")
+@click.option("--exclude-rel", "exclude_relations", metavar="TYPE", multiple=True, help="Do not follow relations of this type (can be given multiple times).")
+@click.option("--exclude-boring", is_flag=True, help=f"Do not follow relations considered boring by the audit ({', '.join(r for r in boring_relations if r != 'MemberOf')}).")
+def paths(sources, targets, max_hops, limit, relations, exclude_relations, exclude_boring):
+    """Find shortest attack paths between objects.
+
+    Start and end nodes are given as selectors, which are either 'tag:TAG' for objects in an asset group,
+    'rid:NAME' for well-known objects in all domains (e.g. 'rid:domain_admins') or the full BloodHound label of an object.
+    By default, paths from objects marked as owned to tier zero objects are searched.
+
+    --rel and --exclude-rel restrict the relations the search may follow, they do not filter the found paths:
+    if the shortest path from a start node uses an excluded relation, the shortest path avoiding it is shown instead.
+
+    Paths are printed as soon as they are found for a start node.
+    """
+
+    exclude_relations = list(exclude_relations)
+    if exclude_boring:
+        exclude_relations += [r for r in boring_relations if r != "MemberOf"]
+    if relations and not set(relations) - set(exclude_relations):
+        log.error("All relations given with --rel are excluded.")
+        sys.exit(1)
+
+    target_sids = {node["objectId"] for selector in targets for node in resolve_selector(selector)}
+    if not target_sids:
+        log.error("No end nodes found for: %s", ", ".join(targets))
+        sys.exit(1)
+
+    source_nodes = {node["objectId"]: node for selector in sources for node in resolve_selector(selector)}
+    if not source_nodes:
+        log.error("No start nodes found for: %s", ", ".join(sources))
+        sys.exit(1)
+
+    for source_sid, source in sorted(source_nodes.items(), key=lambda s: s[1]["label"]):
+        log.debug("Searching paths from %s", source["label"])
+        result = api.shortest_paths(source_sid, target_sids, max_hops=max_hops, limit=limit, relations=relations, exclude_relations=exclude_relations)
+        for path in extract_paths(result, source_sid, target_sids):
+            print(" ".join(
+                element if i % 2 == 0 else f"-[{element}]->"
+                for i, element in enumerate(path)
+            ))
+        sys.stdout.flush()
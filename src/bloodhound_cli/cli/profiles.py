@@ -0,0 +1,99 @@
+import concurrent.futures
+import csv
+import functools
+import io
+import json
+import sys
+
+import click
+
+from bloodhound_cli.api.from_config import api
+from bloodhound_cli.config import config
+from bloodhound_cli.logger import log
+from .output import Output
+from .runner import cancel_on_interrupt, captured_stdout, run_captured
+
+
+def merge_outputs(outputs, output_format="tsv", sep="\t"):
+    """Write the outputs of a command run against several profiles, labeled with the profile name.
+
+    outputs is a list of (profile, output) tuples. For the table format, each output is printed
+    below a heading, for all other formats a profile field is prepended to each row.
+    """
+
+    output_format = output_format.lower()
+    if output_format == "table":
+        for profile, output in outputs:
+            heading = f"{profile} ({config.get('url', profile)})"
+            print(heading)
+            print("#" * len(heading))
+            print()
+            sys.stdout.write(output)
+            print()
+        return
+
+    if output_format == "tsv":
+        for profile, output in outputs:
+            for line in output.splitlines():
+                sys.stdout.write(f"{profile}{sep}{line}\n")
+        sys.stdout.flush()
+        return
+
+    out = None
+    for profile, output in outputs:
+        if not output.strip():
+            continue
+        if output_format == "csv":
+            rows = list(csv.reader(io.StringIO(output)))
+            if out is None:
+                out = Output(["profile"] + rows[0], output_format)
+            for row in rows[1:]:
+                out.write([profile] + row)
+            continue
+        if out is None:
+            out = Output(["profile"], output_format)
+        records = json.loads(output) if output_format == "json" else [json.loads(line) for line in output.splitlines()]
+        for record in records:
+            out.write([profile] + list(record.values()), ["profile"] + list(record))
+    if out is None:
+        out = Output(["profile"], output_format)
+    out.close()
+
+
+def fan_out(func):
+    """Decorator for read commands, running them concurrently against all profiles if --all-profiles is given.
+
+    The outputs are merged and labeled with the profile name, depending on the output format
+    given by the output_format and sep parameters of the command.
+    """
+
+    @functools.wraps(func)
+    def wrapper(**kwargs):
+        if not click.get_current_context().find_root().params.get("all_profiles"):
+            return func(**kwargs)
+
+        profiles = config.profiles()
+
+        def run(profile):
+            with api.use_profile(profile):
+                return run_captured(lambda: func(**kwargs), stream)
+
+        with captured_stdout() as stream:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=len(profiles)) as executor, cancel_on_interrupt():
+                results = list(executor.map(run, profiles))
+
+        outputs = []
+        failed = 0
+        for profile, (exit_code, output, error) in zip(profiles, results):
+            if exit_code != 0:
+                failed += 1
+                log.error("Command failed for profile %s%s", profile, f": {error}" if error else ".")
+                continue
+            outputs.append((profile, output))
+        merge_outputs(outputs, kwargs.get("output_format", "tsv"), kwargs.get("sep", "\t"))
+
+        if failed:
+            sys.exit(1)
+
+    wrapper.fan_out = True
+    return wrapper
@@ -1,33 +1,137 @@
+import concurrent.futures
+import hashlib
 import json
+import os
+import re
 import sys
+import textwrap
+import time
 
 import click
 
+from bloodhound_cli.api import codec
 from bloodhound_cli.api.exceptions import ApiException
 from bloodhound_cli.api.from_config import api
 from bloodhound_cli.logger import log
+from .output import Output, format_option
+from .runner import cancel_on_interrupt
+
+
+def query_hash(query, description=""):
+    """Return a hash identifying the content of a custom query."""
+
+    content = json.dumps([query.strip(), (description or "").strip()])
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def export_queries(file):
+    """Write all saved queries to a file, page by page, and return their number.
+
+    The output is identical to json.dump(..., indent=4) of the complete list.
+    """
+
+    num_queries = 0
+    with open(file, "w", encoding="UTF-8") as f:
+        f.write("[")
+        for entry in api.iter_saved_queries(sort_by="name"):
+            entry = {key: entry[key] for key in ("name", "query", "description")}
+            f.write(",\n" if num_queries else "\n")
+            f.write(textwrap.indent(json.dumps(entry, indent=4), " " * 4))
+            num_queries += 1
+        f.write("\n]" if num_queries else "]")
+    return num_queries
+
+
+def import_query(query, existing_id=None):
+    """Add a custom query or update an existing one. Returns True on success."""
+
+    try:
+        if existing_id is None:
+            api.add_saved_query(query["name"], query["query"], query.get("description", ""))
+        else:
+            api.update_saved_query(existing_id, query["name"], query["query"], query.get("description", ""))
+        return True
+    except ApiException as e:
+        if e.response is not None and e.response.status_code == 400:
+            log.error('Could not import query "%s": %s', query["name"], '\n'.join(error["message"] for error in e.response.json()["errors"]))
+            return False
+        raise
+
+
+def run_query(query, timeout, dump_dir=None):
+    """Run a saved query and return a report row of name, status, nodes, edges, seconds and error.
+
+    If dump_dir is given, the result is written to a JSON file named after the query ID and name.
+    """
+
+    start = time.monotonic()
+    try:
+        result = api.cypher(query["query"], timeout=timeout)
+    except ApiException as e:
+        return [query["name"], "failed", None, None, round(time.monotonic() - start, 3), str(e)]
+    seconds = round(time.monotonic() - start, 3)
+    if dump_dir is not None:
+        name = re.sub(r"[^A-Za-z0-9._-]+", "_", query["name"]).strip("_")
+        with open(os.path.join(dump_dir, f"{query['id']}-{name}.json"), "wb") as f:
+            f.write(codec.dumps(result))
+    return [query["name"], "ok", len(result.get("nodes", {})), len(result.get("edges", [])), seconds, None]
+
+
+def run_queries(jobs, timeout, dump_dir, output_format):
+    """Run all saved queries concurrently and report them, slowest first. Returns the number of failed queries."""
+
+    saved_queries = list(api.iter_saved_queries(sort_by="name"))
+    if dump_dir is not None:
+        os.makedirs(dump_dir, exist_ok=True)
+    log.info("Running %d saved queries...", len(saved_queries))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor, cancel_on_interrupt():
+        rows = list(executor.map(lambda query: run_query(query, timeout, dump_dir), saved_queries))
+
+    with Output(["name", "status", "nodes", "edges", "seconds", "error"], output_format) as out:
+        for row in sorted(rows, key=lambda row: -row[4]):
+            out.write(row)
+    return sum(1 for row in rows if row[1] != "ok")
 
 
 @click.command()
-@click.argument("file", type=click.Path(dir_okay=False))
+@click.argument("file", type=click.Path(dir_okay=False), required=False)
 @click.option("--save", is_flag=True, help="Save existing custom queries to file.")
-def queries(file, save):
-    """Import and export custom queries.
+@click.option("--sync", is_flag=True, help="Also update existing queries whose content differs from the file.")
+@click.option("--run", is_flag=True, help="Run all saved queries and report their results instead.")
+@click.option("--query-timeout", metavar="SECONDS", type=click.FloatRange(min=0, min_open=True), help="Timeout for each query run (default: the timeout of Cypher queries).")
+@click.option("--dump", "dump_dir", metavar="DIRECTORY", type=click.Path(file_okay=False), help="Write the result of each query run to a JSON file in this directory.")
+@click.option("--jobs", "-j", metavar="NUM", type=click.IntRange(min=1), default=8, show_default=True, help="Number of queries imported or run concurrently.")
+@format_option()
+def queries(file, save, sync, run, query_timeout, dump_dir, jobs, output_format):
+    """Import, export and run custom queries.
 
     Imports custom Cypher queries from a file to the BloodHound database.
     If --save is specified, existing queries are exported to a file instead of imported.
+    With --run, all saved queries are run concurrently instead, reporting status, number of nodes and edges,
+    runtime and error for each query, slowest first. No file is needed in this case.
+
+    Queries that already exist with the same name are skipped, so the same file can be imported repeatedly.
+    With --sync, existing queries with the same name but a different query or description are updated to match the file.
 
     For import, the file must either be in the format that --save produces or in the legacy Bloodhound's customqueries.json format.
     However, not everything from the latter might be compatible.
     """
 
+    if run:
+        failed = run_queries(jobs, query_timeout, dump_dir, output_format)
+        if failed:
+            log.error("%d saved queries failed.", failed)
+            sys.exit(1)
+        return
+
+    if file is None:
+        log.error("Missing argument FILE, which is required unless --run is given.")
+        sys.exit(1)
+
     if save:
     # export queries
-        result = api.get_saved_queries(sort_by="name")
-        queries_to_export = [{key: entry[key] for key in ("name", "query", "description")} for entry in result]
-        with open(file, "w", encoding="UTF-8") as f:
-            json.dump(queries_to_export, f, indent=4)
-        log.info("Saved %d queries to %s", len(queries_to_export), file)
+        num_queries = export_queries(file)
+        log.info("Saved %d queries to %s", num_queries, file)
 
     else:
     # import queries
@@ -49,21 +153,39 @@ def queries(file, save):
                 compatible_queries.append({"name": entry["name"], "query": entry["queryList"][0]["query"]})
             queries_to_import = compatible_queries
 
-        num_queries = 0
+        # compare with the existing queries by name and content
+        existing = {
+            entry["name"]: (entry["id"], query_hash(entry["query"], entry.get("description")))
+            for entry in api.iter_saved_queries(sort_by="id")
+        }
+        new_queries = []
+        changed_queries = []
+        num_unchanged = 0
         for query in queries_to_import:
             try:
-                result = api.add_saved_query(
-                    query["name"],
-                    query["query"],
-                    query.get("description", ""),
-                )
-                num_queries += 1
+                name = query["name"]
+                content = query_hash(query["query"], query.get("description", ""))
             except KeyError as e:
                 log.error('Invalid input format, missing key %s', e)
                 sys.exit(1)
-            except ApiException as e:
-                if e.response is not None and e.response.status_code == 400:
-                    log.error('Could not import query "%s": %s', query["name"], '\n'.join(error["message"] for error in e.response.json()["errors"]))
-                else:
-                    raise
-        log.info("Imported %d custom queries.", num_queries)
+            if name not in existing:
+                new_queries.append(query)
+                # duplicate names within the file are only added once
+                existing[name] = (None, content)
+            elif existing[name][1] == content:
+                num_unchanged += 1
+            elif sync and existing[name][0] is not None:
+                changed_queries.append((query, existing[name][0]))
+            else:
+                log.warning('Query "%s" already exists with different content, use --sync to update it.', name)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor, cancel_on_interrupt():
+            added = executor.map(import_query, new_queries)
+            updated = executor.map(lambda args: import_query(*args), changed_queries)
+            num_added = sum(added)
+            num_updated = sum(updated)
+
+        log.info("Imported %d custom queries.", num_added)
+        if sync:
+            log.info("Updated %d custom queries.", num_updated)
+        log.info("Skipped %d unchanged custom queries.", num_unchanged)
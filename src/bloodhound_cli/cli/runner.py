@@ -0,0 +1,127 @@
+import contextlib
+import io
+import sys
+import threading
+
+import click
+
+from bloodhound_cli.api.exceptions import ApiException
+from bloodhound_cli.api.from_config import api
+from bloodhound_cli.logger import log
+
+
+class ThreadLocalStream:
+    """Proxy for a text stream that writes to a per-thread buffer while capturing is enabled."""
+
+    def __init__(self, default):
+        self._default = default
+        self._local = threading.local()
+
+
+    def _target(self):
+        buffer = getattr(self._local, "buffer", None)
+        return self._default if buffer is None else buffer
+
+
+    @contextlib.contextmanager
+    def capture(self):
+        """Capture everything written by the current thread and yield the buffer."""
+
+        buffer = io.StringIO()
+        self._local.buffer = buffer
+        try:
+            yield buffer
+        finally:
+            self._local.buffer = None
+
+
+    def write(self, text):
+        return self._target().write(text)
+
+
+    def flush(self):
+        return self._target().flush()
+
+
+    def __getattr__(self, name):
+        return getattr(self._target(), name)
+
+
+@contextlib.contextmanager
+def cancel_on_interrupt():
+    """Cancel all pending and in-flight API requests if the context is left because of Ctrl-C.
+
+    Use it inside the context of a thread pool, so the pool does not wait for requests that would never finish in time.
+    """
+
+    try:
+        yield
+    except KeyboardInterrupt:
+        log.warning("Interrupted, cancelling pending requests...")
+        api.cancel()
+        raise
+
+
+@contextlib.contextmanager
+def captured_stdout():
+    """Replace sys.stdout with a ThreadLocalStream for the duration of the context and yield it.
+
+    If sys.stdout already is a ThreadLocalStream, e.g. within a batch, it is reused.
+    """
+
+    original = sys.stdout
+    if isinstance(original, ThreadLocalStream):
+        yield original
+        return
+    stream = ThreadLocalStream(original)
+    sys.stdout = stream
+    try:
+        yield stream
+    finally:
+        sys.stdout = original
+
+
+def run_captured(func, stream):
+    """Call a function implementing a command, capturing its output in the given ThreadLocalStream.
+
+    Returns a tuple of exit code, captured output and error message (or None).
+    Any error is turned into a non-zero exit code, only KeyboardInterrupt is raised.
+    """
+
+    error = None
+    with stream.capture() as buffer:
+        try:
+            func()
+            exit_code = 0
+        except SystemExit as e:
+            exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        except click.exceptions.Exit as e:
+            exit_code = e.exit_code
+        except click.ClickException as e:
+            exit_code = e.exit_code
+            error = e.format_message()
+        except click.exceptions.Abort:
+            exit_code = 1
+            error = "Aborted!"
+        except ApiException as e:
+            exit_code = 1
+            error = str(e)
+        except Exception as e:
+            # e.g. unexpected responses, which must not abort the other operations of a batch
+            log.debug("Operation failed with unexpected error", exc_info=True)
+            exit_code = 1
+            error = f"{type(e).__name__}: {e}"
+        output = buffer.getvalue()
+    return exit_code, output, error
+
+
+def run_command(command, args, stream):
+    """Run a command of the CLI with arguments, capturing its output in the given ThreadLocalStream.
+
+    Returns a tuple of exit code, captured output and error message (or None).
+    """
+
+    return run_captured(
+        lambda: command.main(args=list(args), prog_name=f"bhcli {command.name}", standalone_mode=False),
+        stream,
+    )
@@ -1,91 +1,232 @@
+import datetime
+import re
 import sys
+import time
 
 import click
 import prettytable
 
+from bloodhound_cli.api.exceptions import ApiException
 from bloodhound_cli.api.from_config import api
 from bloodhound_cli.constants import RID
+from bloodhound_cli.history import StatsHistory
 from bloodhound_cli.logger import log
-from .paramtypes import DomainType
+from .output import Output, format_option
+from .paramtypes import DomainType, selected_domains
+from .profiles import fan_out
+
+
+def _enabled(nodes):
+    """Return the number of enabled objects."""
+
+    return len([n for n in nodes if n["properties"].get("enabled", "")])
+
+
+def _parse_time(value):
+    """Parse an RFC 3339 timestamp of the server, or return None if it is not one."""
 
+    match = re.fullmatch(r"(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d)(?:\.(\d+))?(Z|[+-]\d\d:\d\d)", value or "")
+    if match is None:
+        return None
+    seconds, fraction, offset = match.groups()
+    fraction = ((fraction or "") + "000000")[:6]
+    return datetime.datetime.fromisoformat(f"{seconds}.{fraction}{'+00:00' if offset == 'Z' else offset}")
+
+
+def _quality_stats(domsid, ingest):
+    """Return the data quality stats of a domain if they were computed after the given ingest.
 
-@click.command()
-@click.option("--domain", "-d", type=DomainType(), help="Show stats for specific domain.")
-def stats(domain):
-    """Get statistics on domains."""
+    Returns None if the server has none, does not support them or the analysis did not run since the ingest.
+    """
+
+    try:
+        quality = api.domain_quality_stats(domsid)
+    except ApiException as e:
+        log.debug("No data quality stats for domain %s: %s", domsid, e)
+        return None
+    if quality is None:
+        return None
+    created, ingested = _parse_time(quality.get("created_at")), _parse_time(ingest)
+    if created is None or ingested is None or created < ingested:
+        log.debug("Data quality stats for domain %s are older than the last ingest, counting objects", domsid)
+        return None
+    return quality
+
+
+def domain_stats(domsid, ingest=None):
+    """Return statistics for a domain as list of (statistic, all, enabled) tuples.
+
+    The number of enabled objects is None where not applicable.
+    With ingest, the end time of the last ingest, the total numbers of objects are taken from the counts
+    the server computed during an analysis after it where available, so only the enabled objects need to be counted.
+    """
+
+    quality = _quality_stats(domsid, ingest) if ingest else None
+    rows = []
+
+    for statistic, listing, key in [("User Accounts", api.users, "users"), ("Computer Accounts", api.computers, "computers")]:
+        if quality is not None and key in quality:
+            enabled = listing(domainsid=domsid, enabled=True, include_properties=False)
+            rows.append((statistic, quality[key], len(enabled)))
+        else:
+            result = listing(domainsid=domsid)
+            rows.append((statistic, len(result), _enabled(result)))
+
+    result = api.group_members(f"{domsid}-{RID.DOMAIN_ADMINS}", kind="User")
+    rows.append(("Domain Admins", len(result), _enabled(result)))
+
+    result = api.group_members(f"{domsid}-{RID.DOMAIN_CONTROLLERS}", kind="Computer")
+    rows.append(("Domain Controllers", len(result), _enabled(result)))
+
+    result = api.group_members(f"{domsid}-{RID.PROTECTED_USERS}", kind="User")
+    rows.append(("Protected Users", len(result), _enabled(result)))
+
+    # statistics without enabled count with the corresponding key of the server's counts
+    listings = [
+        ("Groups", api.groups, "groups"),
+        ("Root CAs", api.root_cas, "rootcas"),
+        ("Enterprise CAs", api.enterprise_cas, "enterprisecas"),
+        ("Cert Templates", api.cert_templates, "certtemplates"),
+    ]
+    for statistic, listing, key in listings:
+        if quality is not None and key in quality:
+            rows.append((statistic, quality[key], None))
+        else:
+            rows.append((statistic, len(listing(domainsid=domsid, include_properties=False)), None))
+
+    return rows
+
+
+def record_stats(domains):
+    """Record the statistics of domains for the last ingest and return them as list of (domain, rows) tuples.
+
+    Domains already recorded for the last ingest are not counted again. If the server has no completed
+    ingest, the current time is used instead.
+    """
+
+    last_ingest = api.last_ingest()
+    ingest = last_ingest or time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    result = []
+    with StatsHistory(api.url) as history:
+        for dom, domsid in domains:
+            rows = history.recorded(domsid, ingest)
+            if rows:
+                log.info("Statistics of %s already recorded for ingest %s", dom, ingest)
+            else:
+                rows = domain_stats(domsid, ingest=last_ingest)
+                history.record(dom, domsid, ingest, rows)
+            result.append((dom, rows))
+    return result
+
+
+def _delta(new, old):
+    if new is None or old is None:
+        return None
+    return new - old
+
+
+def _cell(num_all, num_enabled, signed=False):
+    """Format a number of objects with the number of enabled objects in parentheses, if applicable."""
+
+    fmt = "{:+d}" if signed else "{:d}"
+    if num_all is None:
+        return ""
+    if num_enabled is None:
+        return fmt.format(num_all)
+    return f"{fmt.format(num_all)} ({fmt.format(num_enabled)})"
+
+
+def show_history(domain, last, output_format):
+    """Print the recorded statistics with the changes between ingests, without contacting the server."""
+
+    with StatsHistory(api.url) as history:
+        domains = history.samples(domain, last)
+    if not domains:
+        log.error("No statistics recorded%s, use --record first.", f" for domain {domain}" if domain else "")
+        sys.exit(1)
+
+    if output_format != "table":
+        with Output(["domain", "ingest", "statistic", "all", "enabled", "change_all", "change_enabled"], output_format) as out:
+            for dom, _, samples in domains:
+                previous = {}
+                for ingest, rows in samples:
+                    for statistic, num_all, num_enabled in rows:
+                        old_all, old_enabled = previous.get(statistic, (None, None))
+                        out.write((dom, ingest, statistic, num_all, num_enabled, _delta(num_all, old_all), _delta(num_enabled, old_enabled)))
+                        previous[statistic] = (num_all, num_enabled)
+        return
+
+    for dom, _, samples in domains:
+        # the date is enough to tell ingests apart, unless there were several on the same day
+        dates = [ingest[:10] for ingest, _ in samples]
+        headers = dates if len(set(dates)) == len(dates) else [ingest[:16].replace("T", " ") for ingest, _ in samples]
+        values = [dict((statistic, (num_all, num_enabled)) for statistic, num_all, num_enabled in rows) for _, rows in samples]
+        statistics = []
+        for _, rows in samples:
+            statistics.extend(statistic for statistic, _, _ in rows if statistic not in statistics)
+
+        table = prettytable.PrettyTable()
+        table.set_style(prettytable.SINGLE_BORDER)
+        table.field_names = [dom] + headers + ["change"]
+        table.align = "r"
+        table.align[dom] = "l"
+        for statistic in statistics:
+            cells = [_cell(*sample.get(statistic, (None, None))) for sample in values]
+            first, latest = values[0].get(statistic, (None, None)), values[-1].get(statistic, (None, None))
+            change = _cell(_delta(latest[0], first[0]), _delta(latest[1], first[1]), signed=True)
+            table.add_row([statistic] + cells + [change])
+        print(table)
 
-    domains = sorted((d["name"], d["id"]) for d in api.domains(collected=True))
-    if domain:
-        domains = [d for d in domains if d[0] == domain.upper()]
-        if not domains:
-            log.error("Unknown domain %s.", domain)
-            sys.exit(1)
 
-    for dom, domsid in domains:
+@click.command()
+@click.option("--domain", "-d", type=DomainType(), help="Show stats for specific domain.")
+@click.option("--record", is_flag=True, help="Store the statistics locally together with the time of the last ingest.")
+@click.option("--history", is_flag=True, help="Show the recorded statistics and their changes instead of querying the server.")
+@click.option("--last", metavar="N", type=click.IntRange(min=1), default=6, show_default=True, help="Number of most recent ingests shown with --history.")
+@format_option(default="table")
+@fan_out
+def stats(domain, record, history, last, output_format):
+    """Get statistics on domains.
+
+    With --record, the statistics are stored in a local database together with the end time
+    of the last completed ingest, once per ingest. The total numbers of objects are taken from
+    the counts the server computed during analysis where available, which saves most queries.
+
+    With --history, the recorded statistics of the last ingests are shown together with their changes
+    since the first one shown, without contacting the server. Other formats than table list all
+    recorded values with the change since the previous ingest.
+    """
+
+    if record and history:
+        log.error("The options --record and --history cannot be combined.")
+        sys.exit(1)
+
+    if history:
+        show_history(domain, last, output_format)
+        return
+
+    domains = selected_domains(domain)
+    if record:
+        results = record_stats(domains)
+    else:
+        results = ((dom, domain_stats(domsid)) for dom, domsid in domains)
+
+    if output_format != "table":
+        with Output(["domain", "statistic", "all", "enabled"], output_format) as out:
+            for dom, rows in results:
+                for row in rows:
+                    out.write((dom,) + tuple(row))
+        return
+
+    for dom, rows in results:
         table = prettytable.PrettyTable()
         table.set_style(prettytable.SINGLE_BORDER)
         table.field_names = [dom, "  all  ", "enabled"]
         table.align[dom] = "l"
         table.align["  all  "] = "r"
         table.align["enabled"] = "r"
-
-        row = ["User Accounts"]
-        result = api.users(domainsid=domsid)
-        row.append(len(result))
-        result = [u for u in result if u["properties"].get("enabled", "")]
-        row.append(len(result))
-        table.add_row(row)
-
-        row = ["Computer Accounts"]
-        result = api.computers(domainsid=domsid)
-        row.append(len(result))
-        result = [c for c in result if c["properties"].get("enabled", "")]
-        row.append(len(result))
-        table.add_row(row)
-
-        row = ["Domain Admins"]
-        result = api.group_members(f"{domsid}-{RID.DOMAIN_ADMINS}", kind="User")
-        row.append(len(result))
-        result = [u for u in result if u["properties"].get("enabled", "")]
-        row.append(len(result))
-        table.add_row(row)
-
-        row = ["Domain Controllers"]
-        result = api.group_members(f"{domsid}-{RID.DOMAIN_CONTROLLERS}", kind="Computer")
-        row.append(len(result))
-        result = [c for c in result if c["properties"].get("enabled", "")]
-        row.append(len(result))
-        table.add_row(row)
-
-        row = ["Protected Users"]
-        result = api.group_members(f"{domsid}-{RID.PROTECTED_USERS}", kind="User")
-        row.append(len(result))
-        result = [u for u in result if u["properties"].get("enabled", "")]
-        row.append(len(result))
-        table.add_row(row)
-
-        row = ["Groups"]
-        result = api.groups(domainsid=domsid)
-        row.append(len(result))
-        row.append("")
-        table.add_row(row)
-
-        row = ["Root CAs"]
-        result = api.root_cas(domainsid=domsid)
-        row.append(len(result))
-        row.append("")
-        table.add_row(row)
-
-        row = ["Enterprise CAs"]
-        result = api.enterprise_cas(domainsid=domsid)
-        row.append(len(result))
-        row.append("")
-        table.add_row(row)
-
-        row = ["Cert Templates"]
-        result = api.cert_templates(domainsid=domsid)
-        row.append(len(result))
-        row.append("")
-        table.add_row(row)
-
+        table.add_rows([
+            (statistic, num_all, "" if num_enabled is None else num_enabled)
+            for statistic, num_all, num_enabled in rows
+        ])
         print(table)
@@ -1,23 +1,129 @@
+import hashlib
+import os
 import sys
 import time
 
 import click
 
+from bloodhound_cli import state
 from bloodhound_cli.api.from_config import api
+from bloodhound_cli.constants import UploadStatus
 from bloodhound_cli.logger import log
 
 
+FAILED_STATUSES = {UploadStatus.CANCELED, UploadStatus.TIMED_OUT, UploadStatus.FAILED}
+"""Status of file upload jobs that ended without the data being ingested."""
+
+
+def file_hash(path):
+    """Return the SHA-256 hash of a file's content, read in chunks."""
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def record_ingested(journal):
+    """Record the files uploaded by the journal's job as ingested and remove the job from the journal."""
+
+    job = journal["job"]
+    for digest, entry in job["files"].items():
+        if entry["status"] == "acked":
+            journal["ingested"][digest] = {"path": entry["path"], "size": entry["size"], "job": job["id"]}
+    journal["job"] = None
+
+
+def wait_for_ingest(journal):
+    """Wait until the ingestion of the journal's job finished and record the ingested files.
+
+    Files are only recorded if the ingestion completed fully, a partially completed ingestion
+    is reported as warning. Returns True unless the ingestion failed.
+    """
+
+    job = journal["job"]
+    while True:
+        time.sleep(5)
+        result = api.upload_status(job["id"])
+        if result[0]["status"] == UploadStatus.COMPLETE:
+            record_ingested(journal)
+            state.save("upload", api.url, journal)
+            log.info("Ingestion completed, the data is now available.")
+            return True
+        if result[0]["status"] == UploadStatus.PARTIALLY_COMPLETE:
+            journal["job"] = None
+            state.save("upload", api.url, journal)
+            log.warning("Ingestion partially completed, some data is missing: %s", result[0].get("status_message"))
+            return True
+        if result[0]["status"] in FAILED_STATUSES:
+            journal["job"] = None
+            state.save("upload", api.url, journal)
+            log.error("Ingestion failed: %s", result[0].get("status_message"))
+            return False
+
+
 @click.command()
 @click.argument("files", metavar="FILE...", nargs=-1, required=True, type=click.Path(exists=True))
-def upload(files):
+@click.option("--resume", is_flag=True, help="Continue an interrupted upload job.")
+@click.option("--skip-ingested", is_flag=True, help="Skip files whose content was already ingested by an earlier upload.")
+def upload(files, resume, skip_ingested):
     """Upload and ingest files from the BloodHound collector.
 
     Supported are JSON and ZIP files.
+
+    A local journal records the upload job and the hash, size and status of each file.
+    With --skip-ingested, files whose content was already ingested by an earlier upload are skipped,
+    as long as the server still knows the upload job which ingested them.
+    With --resume, an interrupted upload job is continued with the files not yet sent,
+    or, if the server does not accept files for it anymore, a new job is started for them.
+    Files the resumed job already ingested are never uploaded again.
     """
 
-    log.info("Starting new file upload job...")
-    upload_id = api.start_upload()["id"]
+    journal = state.load("upload", api.url, default={"job": None, "ingested": {}})
+    job = journal["job"]
+
+    if job is not None and not resume:
+        log.warning("Upload job %d was interrupted, use --resume to continue it. Starting a new job instead.", job["id"])
+        job = journal["job"] = None
+    resumed_id = None
+    if job is not None:
+        resumed_id = job["id"]
+        jobs = api.upload_status(job["id"])
+        status = jobs[0]["status"] if jobs else None
+        if status is None:
+            # e.g. after the server's database was cleared
+            log.info("Upload job %d is unknown to the server, starting a new job.", job["id"])
+            journal["job"] = None
+        elif job["ended"] and status in (UploadStatus.INGESTING, UploadStatus.ANALYZING):
+            log.info("Waiting for ingestion of interrupted upload job %d...", job["id"])
+            wait_for_ingest(journal)
+        elif status == UploadStatus.COMPLETE:
+            # ingestion finished while we were not waiting for it
+            record_ingested(journal)
+        elif status == UploadStatus.PARTIALLY_COMPLETE:
+            log.warning("Ingestion of upload job %d partially completed, its files are not recorded as ingested.", job["id"])
+            journal["job"] = None
+        elif job["ended"] or status != UploadStatus.RUNNING:
+            log.info("Upload job %d cannot be continued, starting a new job.", job["id"])
+            journal["job"] = None
+        job = journal["job"]
+
+    known_jobs = {}
+
+    def ingested_before(digest):
+        """Return whether a file was ingested by an upload job the server still knows, e.g. not after clearing its database."""
 
+        entry = journal["ingested"].get(digest)
+        if entry is None:
+            return False
+        if entry["job"] not in known_jobs:
+            jobs = api.upload_status(entry["job"])
+            known_jobs[entry["job"]] = bool(jobs) and jobs[0]["status"] == UploadStatus.COMPLETE
+        return known_jobs[entry["job"]]
+
+    to_upload = []
+    hashes = set()
     for file in files:
         if file.lower().endswith(".json"):
             content_type = "application/json"
@@ -26,21 +132,48 @@ def upload(files):
         else:
             log.warning("File of unsupported type will be ignored: %s", file)
             continue
+        digest = file_hash(file)
+        if digest in hashes:
+            log.info("Skipping duplicate file %s", file)
+            continue
+        hashes.add(digest)
+        if resumed_id is not None and journal["ingested"].get(digest, {}).get("job") == resumed_id:
+            log.info("Skipping file %s, already ingested by resumed job %d", file, resumed_id)
+            continue
+        if skip_ingested and ingested_before(digest):
+            log.info("Skipping file %s, identical content was already ingested from %s", file, journal["ingested"][digest]["path"])
+            continue
+        if job is not None and job["files"].get(digest, {}).get("status") == "acked":
+            log.info("Skipping file %s, already uploaded to job %d", file, job["id"])
+            continue
+        to_upload.append((file, digest, content_type))
+
+    if not to_upload and job is None:
+        log.info("Nothing to upload, all files were already ingested.")
+        state.save("upload", api.url, journal)
+        sys.exit(0)
+
+    if job is None:
+        log.info("Starting new file upload job...")
+        job = journal["job"] = {"id": api.start_upload()["id"], "ended": False, "files": {}}
+    else:
+        log.info("Continuing file upload job %d...", job["id"])
+    state.save("upload", api.url, journal)
+
+    for file, digest, content_type in to_upload:
         with open(file, "rb") as f:
             content = f.read()
+        job["files"][digest] = {"path": os.path.abspath(file), "size": len(content), "status": "sent"}
+        state.save("upload", api.url, journal)
         log.info("Uploading file %s", file)
-        api.upload_file(upload_id, content, content_type)
+        api.upload_file(job["id"], content, content_type)
+        job["files"][digest]["status"] = "acked"
+        state.save("upload", api.url, journal)
 
     log.info("Ending file upload job...")
-    api.end_upload(upload_id)
+    api.end_upload(job["id"])
+    job["ended"] = True
+    state.save("upload", api.url, journal)
 
     log.info("Now waiting for ingestion being complete...")
-    while True:
-        time.sleep(5)
-        result = api.upload_status(upload_id)
-        if result[0]["status"] == 2:
-            log.info("Ingestion completed, the data is now available.")
-            sys.exit(0)
-        if result[0]["status"] == 5:
-            log.error("Ingestion failed: %s", result[0]["status_message"])
-            sys.exit(1)
+    sys.exit(0 if wait_for_ingest(journal) else 1)
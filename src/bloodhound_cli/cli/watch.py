@@ -0,0 +1,161 @@
+import datetime
+import json
+import sys
+import time
+
+import click
+import requests
+
+from bloodhound_cli.api.domains import DomainDirectory
+from bloodhound_cli.api.exceptions import ApiException
+from bloodhound_cli.api.from_config import api
+from bloodhound_cli.constants import UploadStatus
+from bloodhound_cli.logger import log
+from bloodhound_cli.membership import MembershipIndex
+from .audit import checks
+from .paramtypes import DomainType
+from .stats import domain_stats
+
+
+BUSY_UPLOAD_STATUSES = {UploadStatus.READY, UploadStatus.RUNNING, UploadStatus.INGESTING, UploadStatus.ANALYZING}
+"""Status of file upload jobs that are not finished yet."""
+
+
+def emit(event, **fields):
+    """Write an event as JSON line to stdout."""
+
+    record = {
+        "event": event,
+        "time": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+    }
+    record.update(fields)
+    sys.stdout.write(json.dumps(record) + "\n")
+    sys.stdout.flush()
+
+
+class Watcher:
+    """Keeps the latest audit findings and statistics per domain and emits the changes.
+
+    Only the results of the last evaluation are kept, so memory usage does not grow over time.
+    """
+
+    def __init__(self, domain=None, use_index=False):
+        self.domain = domain
+        self.use_index = use_index
+        self.ingest = None
+        self._lastseen = {}
+        self._findings = {}
+        self._stats = {}
+
+
+    def _affected_domains(self):
+        """Return (name, sid, lastseen) tuples of the domains whose domain object changed since the last evaluation.
+
+        Domains without a lastseen timestamp are always considered affected. If no domain object changed,
+        all domains are returned: partial collections like session loops or computer-only uploads do not
+        contain the domain objects, so the domains they touched cannot be told apart.
+        """
+
+        directory = DomainDirectory(api.domains())
+        domains = [(d["name"], d["id"]) for d in directory.collected()]
+        if self.domain:
+            entry = directory.get(self.domain)
+            domains = [(entry["name"], entry["id"])] if entry is not None else []
+        lastseen = {
+            node["objectId"]: node["properties"].get("lastseen")
+            for node in api.domain_objects()
+        }
+        affected = [
+            (dom, domsid, lastseen.get(domsid))
+            for dom, domsid in domains
+            if lastseen.get(domsid) is None or lastseen[domsid] != self._lastseen.get(domsid)
+        ]
+        return affected or [(dom, domsid, lastseen.get(domsid)) for dom, domsid in domains]
+
+
+    def evaluate(self, report=True):
+        """Run audit checks and statistics for the affected domains and return the number of changes.
+
+        With report, new and removed findings as well as changed statistics are emitted as events.
+        """
+
+        index = MembershipIndex.fetch(api) if self.use_index else None
+        num_changes = 0
+
+        for dom, domsid, lastseen in self._affected_domains():
+            findings = self._findings.setdefault(domsid, {})
+            for check in checks:
+                rows = set(check.run(domsid, index))
+                previous = findings.get(check.name, set())
+                for status, changed in (("new", rows - previous), ("removed", previous - rows)):
+                    for row in sorted(changed):
+                        num_changes += 1
+                        if report:
+                            emit("finding", domain=dom, check=check.name, status=status, **dict(zip(check.keys, row)))
+                findings[check.name] = rows
+
+            stats = self._stats.setdefault(domsid, {})
+            for statistic, num_all, num_enabled in domain_stats(domsid):
+                previous = stats.get(statistic)
+                if previous is not None and previous != (num_all, num_enabled):
+                    num_changes += 1
+                    if report:
+                        emit(
+                            "statistic", domain=dom, statistic=statistic,
+                            all=num_all, enabled=num_enabled,
+                            previous_all=previous[0], previous_enabled=previous[1],
+                        )
+                stats[statistic] = (num_all, num_enabled)
+
+            # only remembered once the domain is completely evaluated, so failures are retried
+            self._lastseen[domsid] = lastseen
+
+        return num_changes
+
+
+@click.command()
+@click.option("--domain", "-d", type=DomainType(), help="Watch specific domain only.")
+@click.option("--interval", metavar="SECONDS", type=click.IntRange(min=1), default=10, show_default=True, help="Minimum time between two polls.")
+@click.option("--max-interval", metavar="SECONDS", type=click.IntRange(min=1), default=300, show_default=True, help="Maximum time between two polls while nothing happens.")
+@click.option("--initial", is_flag=True, help="Report all findings present at startup as new.")
+@click.option("--index", "use_index", is_flag=True, help="Resolve group memberships from a local index instead of server-side traversals.")
+def watch(domain, interval, max_interval, initial, use_index):
+    """Watch for completed ingests and report new findings.
+
+    Polls the status of file upload jobs and, whenever an ingest completes, re-runs the audit checks
+    and statistics for the domains whose domain object was collected again, or for all domains if the ingest
+    contained none, e.g. from a session loop. Every change is printed as JSON line:
+    an 'ingest' event for the completed ingest, 'finding' events for new or removed audit findings
+    and 'statistic' events for changed counters.
+
+    The poll interval starts at --interval and doubles up to --max-interval while no upload job is in progress.
+    Press Ctrl-C to stop watching.
+    """
+
+    max_interval = max(interval, max_interval)
+    watcher = Watcher(domain, use_index)
+
+    try:
+        watcher.ingest = api.last_ingest()
+        num_findings = watcher.evaluate(report=initial)
+        emit("started", ingest=watcher.ingest, findings=num_findings)
+
+        delay = interval
+        while True:
+            time.sleep(delay)
+            try:
+                last_ingest = api.last_ingest()
+                if last_ingest != watcher.ingest:
+                    emit("ingest", ingest=last_ingest)
+                    watcher.evaluate()
+                    watcher.ingest = last_ingest
+                    delay = interval
+                    continue
+                jobs = api.upload_status(sort_by="-id", limit=1)
+                busy = any(job.get("status") in BUSY_UPLOAD_STATUSES for job in jobs)
+            except (ApiException, requests.exceptions.RequestException) as e:
+                log.warning("Polling failed, trying again later: %s", e)
+                busy = False
+            delay = interval if busy else min(delay * 2, max_interval)
+    except KeyboardInterrupt:
+        log.info("Stopped watching.")
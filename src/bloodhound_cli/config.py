@@ -4,20 +4,30 @@ import os
 from bloodhound_cli.logger import log
 
 
+DEFAULT_PROFILE = "default"
+"""Name of the profile stored in the DEFAULT section of the config file."""
+
+PROFILE_KEYS = ["url", "token_id", "token_key"]
+"""Keys every configured profile needs to have in its own section."""
+
+_NO_DEFAULTS = "bhcli:no-defaults"
+"""Default section of the parser, which never occurs in the config file.
+
+The DEFAULT section of the file is a regular section this way, so profiles never inherit
+its server or credentials.
+"""
+
+
 class Config:
     """Class to interact with the tool's configuration file."""
 
     def __init__(self):
         """Initialize the Config class, read (and if necessary create) the config file."""
 
-        self._configparser = configparser.ConfigParser()
-        self._configparser.read_dict({
-            "DEFAULT": {
-                "url": "",
-                "token_id": "",
-                "token_key": "",
-            }
-        })
+        self.profile = DEFAULT_PROFILE
+        """Profile used unless another one is explicitly requested."""
+
+        self._configparser = self._parser()
 
         config_home = os.environ.get("XDG_CONFIG_HOME", default=os.path.join(os.path.expanduser("~"), ".config"))
         config_dir = os.path.join(config_home, "bhcli")
@@ -36,17 +46,76 @@ class Config:
         self._configparser.read(self.config_file)
 
 
-    def get(self, key):
-        """Return the configuration value specified by a given key."""
+    @staticmethod
+    def _parser():
+        """Return a new parser for the config file, with the default values set."""
+
+        parser = configparser.ConfigParser(default_section=_NO_DEFAULTS)
+        parser.read_dict({
+            "DEFAULT": {
+                "url": "",
+                "token_id": "",
+                "token_key": "",
+            }
+        })
+        return parser
+
+
+    def reload(self):
+        """Read the config file again, e.g. after it was changed by another process."""
+
+        parser = self._parser()
+        parser.read(self.config_file)
+        self._configparser = parser
+
+
+    def _section(self, profile=None):
+        """Return the name of the section holding the configuration of a profile."""
+
+        profile = profile or self.profile
+        return "DEFAULT" if profile == DEFAULT_PROFILE else profile
+
+
+    def profiles(self):
+        """Return the names of all profiles with a configured server."""
+
+        names = [DEFAULT_PROFILE] if self.get("url", DEFAULT_PROFILE) else []
+        return names + [section for section in self._configparser.sections() if section != "DEFAULT"]
+
+
+    def get(self, key, profile=None, fallback=""):
+        """Return the configuration value specified by a given key, for the current profile if none is given.
+
+        Only the profile's own section is used, fallback is returned if the key is not set there.
+        """
+
+        return self._configparser.get(self._section(profile), key, fallback=fallback)
+
+
+    def getboolean(self, key, profile=None, fallback=False):
+        """Return the boolean configuration value specified by a given key, or fallback if it is not set."""
+
+        return self._configparser.getboolean(self._section(profile), key, fallback=fallback)
+
+
+    def missing_keys(self, profile=None):
+        """Return the keys of PROFILE_KEYS not set in a profile, which is incomplete unless none or all are set."""
+
+        missing = [key for key in PROFILE_KEYS if not self.get(key, profile)]
+        return [] if len(missing) == len(PROFILE_KEYS) else missing
 
-        return self._configparser["DEFAULT"][key]
 
+    def update(self, profile=None, **kwargs):
+        """Update the configuration with key=value pairs and save to file.
 
-    def update(self, **kwargs):
-        """Update the configuration with key=value pairs and save to file."""
+        The values are stored in the current profile if none is given, which is created if necessary.
+        """
 
+        section = self._section(profile)
+        if not self._configparser.has_section(section):
+            self._configparser.add_section(section)
         for k, v in kwargs.items():
-            self._configparser["DEFAULT"][k] = v
+            self._configparser[section][k] = v
 
         with open(self.config_file, "w", encoding="UTF-8") as f:
             self._configparser.write(f)
@@ -2,11 +2,36 @@ from enum import IntEnum
 
 
 class RID(IntEnum):
-    """Well-known RID constants."""
+    """Well-known RID constants.
+
+    The builtin groups (544 and above) have the same SID in every domain,
+    BloodHound prefixes their object ID with the domain name instead.
+    """
 
     GUEST = 501
     DOMAIN_ADMINS = 512
     DOMAIN_USERS = 513
     DOMAIN_COMPUTERS = 515
     DOMAIN_CONTROLLERS = 516
+    SCHEMA_ADMINS = 518
+    ENTERPRISE_ADMINS = 519
     PROTECTED_USERS = 525
+    ADMINISTRATORS = 544
+    ACCOUNT_OPERATORS = 548
+    SERVER_OPERATORS = 549
+    PRINT_OPERATORS = 550
+    BACKUP_OPERATORS = 551
+
+
+class UploadStatus(IntEnum):
+    """Status of file upload jobs."""
+
+    READY = 0
+    RUNNING = 1
+    COMPLETE = 2
+    CANCELED = 3
+    TIMED_OUT = 4
+    FAILED = 5
+    INGESTING = 6
+    ANALYZING = 7
+    PARTIALLY_COMPLETE = 8
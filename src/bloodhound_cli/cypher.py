@@ -1,5 +1,7 @@
 import re
 
+from bloodhound_cli.constants import RID
+
 
 def escape(param):
     """Escapes and formats a parameter for inclusion in a Cypher query."""
@@ -13,6 +15,9 @@ def escape(param):
     if isinstance(param, bool):
         return str(param).lower()
 
+    if isinstance(param, (int, float)):
+        return repr(param)
+
     if isinstance(param, list):
         escaped_list = []
         for x in param:
@@ -44,13 +49,32 @@ def node(name=None, label=None):
     return result
 
 
-def where(node_name, comparison_operator="=", boolean_operator="AND", **kwargs):
-    """Construct WHERE clauses comparing properties of node as specified in kwargs."""
+def relationship_types(types):
+    """Construct a relationship type pattern matching any of the given types, e.g. :`MemberOf`|`AdminTo`."""
+
+    return ":" + "|".join(f"`{escape(t)}`" for t in types)
+
+
+def well_known_sid(node_name, rid):
+    """Construct a condition matching the object with a well-known RID in its own domain.
+
+    Local principals of computers, foreign security principals and objects of trusted domains
+    whose SID merely ends with the same RID do not match.
+    """
+
+    _validate_node_name(node_name)
+    rid = int(rid)
+    if rid >= RID.ADMINISTRATORS:
+        # builtin groups have the same SID in every domain, BloodHound prefixes it with the domain name
+        return f'({node_name}.objectid ENDS WITH "-S-1-5-32-{rid}" AND {node_name}.objectid = {node_name}.domain + "-S-1-5-32-{rid}")'
+    return f'({node_name}.objectid ENDS WITH "-{rid}" AND {node_name}.objectid = {node_name}.domainsid + "-{rid}")'
+
+
+def conditions(node_name, comparison_operator="=", **kwargs):
+    """Construct a list of conditions comparing properties of node as specified in kwargs."""
 
     if comparison_operator not in ["=", "IN"]:
         raise ValueError("Unsupported comparison operator for WHERE.")
-    if boolean_operator not in ["AND", "OR"]:
-        raise ValueError("Unsupported boolean operator for WHERE.")
     _validate_node_name(node_name)
 
     clauses = []
@@ -62,7 +86,28 @@ def where(node_name, comparison_operator="=", boolean_operator="AND", **kwargs):
                 clauses.append(f'{node_name}.`{escaped_key}` {comparison_operator} "{escaped_value}"')
             else:
                 clauses.append(f'{node_name}.`{escaped_key}` {comparison_operator} {escaped_value}')
+    return clauses
+
 
+def where(node_name, comparison_operator="=", boolean_operator="AND", **kwargs):
+    """Construct WHERE clauses comparing properties of node as specified in kwargs."""
+
+    if boolean_operator not in ["AND", "OR"]:
+        raise ValueError("Unsupported boolean operator for WHERE.")
+
+    clauses = conditions(node_name, comparison_operator, **kwargs)
     if clauses:
         return "WHERE " + f" {boolean_operator} ".join(clauses)
     return ""
+
+
+def ends_with(node_name, key, suffixes, negate=False):
+    """Construct a condition matching nodes whose property ends with any of the given suffixes.
+
+    With negate, the condition matches nodes whose property ends with none of the suffixes.
+    """
+
+    _validate_node_name(node_name)
+    escaped_key = escape(key)
+    condition = " OR ".join(f'{node_name}.`{escaped_key}` ENDS WITH "{escape(suffix)}"' for suffix in suffixes)
+    return f"NOT ({condition})" if negate else f"({condition})"
@@ -0,0 +1,324 @@
+import io
+import json
+import os
+import socket
+import struct
+import sys
+import time
+import traceback
+
+from bloodhound_cli import state
+
+
+FORWARDED_COMMANDS = {"audit", "computers", "cypher", "domains", "exposure", "groups", "members", "paths", "stats", "users"}
+"""Commands run by the daemon if it is running. These only read data and write their results to stdout."""
+
+FORWARDED_ENV = ["BHCLI_PROFILE", "_BHCLI_COMPLETE", "COMP_WORDS", "COMP_CWORD"]
+"""Environment variables passed to the daemon, which select the profile or request shell completion."""
+
+OPTIONS_WITH_VALUE = {"--profile", "--timeout"}
+"""Options of the main command taking a value, which have to be skipped when looking for the command name."""
+
+START_TIMEOUT = 1.0
+"""Seconds to wait for the daemon to start running a command, e.g. while it is busy with another one, before running it locally."""
+
+COMPLETION_TIMEOUT = 2.0
+"""Seconds to wait for the daemon to answer a shell completion request before completing locally."""
+
+FRAME_HEADER = struct.Struct("<cI")
+"""Header of the frames the daemon sends while running a command: channel and payload length."""
+
+CHANNEL_STARTED = b"s"
+CHANNEL_STDOUT = b"o"
+CHANNEL_STDERR = b"e"
+CHANNEL_EXIT = b"x"
+
+
+def socket_path():
+    """Return the path of the Unix socket the daemon listens on."""
+
+    return os.path.join(state.state_dir(), "daemon.sock")
+
+
+def _command_name(args):
+    """Return the name of the command in a command line, or None if there is none."""
+
+    skip = False
+    for arg in args:
+        if skip:
+            skip = False
+        elif arg in OPTIONS_WITH_VALUE:
+            skip = True
+        elif not arg.startswith("-"):
+            return arg
+    return None
+
+
+def _reads_stdin(args):
+    """Return whether a command line reads from stdin, e.g. with '-', '--file=-' or '-f-'."""
+
+    return any(
+        arg == "-" or arg.endswith("=-") or (arg.startswith("-") and not arg.startswith("--") and len(arg) > 2 and arg.endswith("-"))
+        for arg in args
+    )
+
+
+def _frames(sock):
+    """Yield the (channel, payload) frames received on a socket until the connection is closed."""
+
+    stream = sock.makefile("rb")
+    while True:
+        header = stream.read(FRAME_HEADER.size)
+        if not header:
+            return
+        if len(header) < FRAME_HEADER.size:
+            raise ConnectionResetError("The daemon closed the connection in the middle of a frame.")
+        channel, length = FRAME_HEADER.unpack(header)
+        payload = stream.read(length)
+        if len(payload) < length:
+            raise ConnectionResetError("The daemon closed the connection in the middle of a frame.")
+        yield channel, payload
+
+
+def request(message, timeout=None):
+    """Send a message to the daemon and return its response.
+
+    Raises OSError if the daemon is not running.
+    """
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path())
+        sock.sendall(json.dumps(message).encode())
+        sock.shutdown(socket.SHUT_WR)
+        chunks = []
+        while True:
+            chunk = sock.recv(1 << 16)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    if not chunks:
+        raise ConnectionResetError("The daemon closed the connection without response.")
+    return json.loads(b"".join(chunks))
+
+
+def forward(args):
+    """Run a command line by the daemon if it is running and the command is one of FORWARDED_COMMANDS.
+
+    Shell completion requests are forwarded as well. The output of commands is streamed as the daemon
+    produces it, completions are only written once complete. Returns the exit code, or None if the
+    command has to be run locally, e.g. because the daemon did not start running it in time.
+    """
+
+    completion = "_BHCLI_COMPLETE" in os.environ
+    if not completion and _command_name(args) not in FORWARDED_COMMANDS:
+        return None
+    if _reads_stdin(args):
+        # the command reads from stdin, which the daemon has no access to
+        return None
+    if not os.path.exists(socket_path()):
+        return None
+    message = {
+        "args": args,
+        "cwd": os.getcwd(),
+        "env": {key: os.environ[key] for key in FORWARDED_ENV if key in os.environ},
+    }
+    streams = {CHANNEL_STDOUT: sys.stdout.buffer, CHANNEL_STDERR: sys.stderr.buffer}
+    output = []
+    started = False
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(COMPLETION_TIMEOUT if completion else START_TIMEOUT)
+            sock.connect(socket_path())
+            sock.sendall(json.dumps(message).encode())
+            sock.shutdown(socket.SHUT_WR)
+            for channel, payload in _frames(sock):
+                if channel == CHANNEL_STARTED:
+                    if not completion:
+                        started = True
+                        sock.settimeout(None)
+                elif channel == CHANNEL_EXIT:
+                    for stream, data in output:
+                        streams[stream].write(data)
+                    return struct.unpack("<i", payload)[0]
+                elif completion:
+                    output.append((channel, payload))
+                else:
+                    streams[channel].write(payload)
+                    streams[channel].flush()
+    except OSError as e:
+        if not started:
+            return None
+        sys.stderr.write(f"Lost the connection to the daemon: {e}\n")
+        return 1
+    if not started:
+        return None
+    sys.stderr.write("The daemon closed the connection before the command finished.\n")
+    return 1
+
+
+class _ChannelWriter(io.RawIOBase):
+    """Raw stream sending everything written to it as frames of a channel on a connection.
+
+    If the client went away, e.g. because it was interrupted, the output is discarded.
+    """
+
+    def __init__(self, connection, channel):
+        super().__init__()
+        self._connection = connection
+        self._channel = channel
+        self.broken = False
+
+
+    def writable(self):
+        return True
+
+
+    def write(self, data):
+        if not self.broken:
+            try:
+                self._connection.sendall(FRAME_HEADER.pack(self._channel, len(data)) + bytes(data))
+            except OSError:
+                self.broken = True
+        return len(data)
+
+
+class Daemon:
+    """Server running commands in a warm process, which keeps the configuration, connections and caches.
+
+    Requests are JSON objects with the command line, working directory and environment of the client,
+    handled one at a time. While running a command, the daemon sends frames announcing the start,
+    everything written to stdout and stderr as it is written, and finally the exit code.
+    """
+
+    def __init__(self):
+        # imported here, so that forwarding commands does not need to load the CLI
+        from bloodhound_cli.api.from_config import api
+        from bloodhound_cli.cli import bloodhound_cli
+        from bloodhound_cli.config import config
+
+        self._api = api
+        self._cli = bloodhound_cli
+        self._config = config
+        self._config_mtime = self._mtime()
+        self.started = time.time()
+        self.requests = 0
+        self._running = False
+
+
+    def _mtime(self):
+        try:
+            return os.path.getmtime(self._config.config_file)
+        except OSError:
+            return None
+
+
+    def serve(self):
+        """Listen on the socket and handle requests until a stop request is received."""
+
+        from bloodhound_cli.logger import log
+
+        path = socket_path()
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        if os.path.exists(path):
+            os.unlink(path)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.bind(path)
+            os.chmod(path, 0o600)
+            sock.listen()
+            log.info("Daemon %d listening on %s", os.getpid(), path)
+            self._running = True
+            try:
+                while self._running:
+                    connection, _ = sock.accept()
+                    with connection:
+                        self._handle(connection)
+            finally:
+                os.unlink(path)
+        log.info("Daemon %d stopped after %d requests", os.getpid(), self.requests)
+
+
+    def _handle(self, connection):
+        chunks = []
+        while True:
+            chunk = connection.recv(1 << 16)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        message = json.loads(b"".join(chunks))
+        command = message.get("command", "run")
+        if command == "status":
+            response = {"pid": os.getpid(), "started": self.started, "requests": self.requests}
+        elif command == "stop":
+            self._running = False
+            response = {"pid": os.getpid()}
+        else:
+            try:
+                connection.sendall(FRAME_HEADER.pack(CHANNEL_STARTED, 0))
+            except OSError:
+                # the client gave up waiting, e.g. while another command was running, and runs the command itself
+                return
+            self.requests += 1
+            exit_code = self._run(connection, message["args"], message.get("cwd"), message.get("env", {}))
+            _ChannelWriter(connection, CHANNEL_EXIT).write(struct.pack("<i", exit_code))
+            return
+        try:
+            connection.sendall(json.dumps(response).encode())
+        except OSError:
+            # the client went away, e.g. because it was interrupted
+            pass
+
+
+    def _run(self, connection, args, cwd, env):
+        """Run a command line like the bhcli entry point does, with the client's working directory and environment.
+
+        The output is sent to the client while the command runs, the exit code is returned.
+        """
+
+        from bloodhound_cli.api.exceptions import ApiException
+        from bloodhound_cli.config import DEFAULT_PROFILE
+        from bloodhound_cli.logger import log
+
+        mtime = self._mtime()
+        if mtime != self._config_mtime:
+            # e.g. changed by the auth subcommand, which is never run by the daemon
+            self._config.reload()
+            self._api.reset()
+            self._config_mtime = mtime
+
+        saved_env = {key: os.environ.pop(key, None) for key in FORWARDED_ENV}
+        os.environ.update(env)
+        saved_cwd = os.getcwd()
+        saved_streams = sys.stdout, sys.stderr
+        handler = log.handlers[0]
+        # click writes completions as bytes, so stdout needs a binary buffer
+        stdout = io.TextIOWrapper(io.BufferedWriter(_ChannelWriter(connection, CHANNEL_STDOUT)), encoding="UTF-8")
+        stderr = io.TextIOWrapper(io.BufferedWriter(_ChannelWriter(connection, CHANNEL_STDERR)), encoding="UTF-8", line_buffering=True)
+        sys.stdout, sys.stderr = stdout, stderr
+        saved_handler_stream = handler.setStream(stderr)
+        try:
+            if cwd:
+                os.chdir(cwd)
+            self._cli.main(args=args, prog_name="bhcli")
+            exit_code = 0
+        except SystemExit as e:
+            exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        except ApiException as e:
+            log.error("%s", e)
+            exit_code = 1
+        except Exception:
+            traceback.print_exc(file=stderr)
+            exit_code = 1
+        finally:
+            stdout.flush()
+            stderr.flush()
+            handler.setStream(saved_handler_stream)
+            sys.stdout, sys.stderr = saved_streams
+            os.chdir(saved_cwd)
+            for key, value in saved_env.items():
+                os.environ.pop(key, None)
+                if value is not None:
+                    os.environ[key] = value
+            self._config.profile = DEFAULT_PROFILE
+            self._api.reset_timeouts()
+        return exit_code
@@ -0,0 +1,182 @@
+import csv
+import json
+import os
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+CHECKPOINT_FILE = "checkpoint.json"
+"""Name of the file in the export directory recording the progress of the export."""
+
+SCHEMA_FILE = "schema.json"
+"""Name of the file in the export directory describing the columns of all part files."""
+
+FORMATS = ["parquet", "csv"]
+"""Supported file formats of the part files."""
+
+
+def default_format():
+    """Return the most compact file format available."""
+
+    return "parquet" if pyarrow is not None else "csv"
+
+
+def _type_name(value):
+    """Return the name of the JSON type of a property value."""
+
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, int):
+        return "integer"
+    if isinstance(value, float):
+        return "number"
+    if isinstance(value, list):
+        return "array"
+    if isinstance(value, dict):
+        return "object"
+    return "string"
+
+
+def _csv_value(value):
+    """Return the representation of a property value in a CSV file."""
+
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value
+    return json.dumps(value)
+
+
+def node_record(node_id, node):
+    """Return the flat record of a node as written to the part files."""
+
+    record = {"id": node_id, "objectid": node["objectId"]}
+    record.update(node.get("properties") or {})
+    return record
+
+
+def edge_record(edge, source, target):
+    """Return the flat record of an edge as written to the part files."""
+
+    record = {
+        "source": int(edge["source"]),
+        "target": int(edge["target"]),
+        "source_objectid": source["objectId"],
+        "target_objectid": target["objectId"],
+    }
+    record.update(edge.get("properties") or {})
+    return record
+
+
+class GraphExport:
+    """Directory containing a graph dump, written page by page.
+
+    Nodes and edges are written to separate part files per page and per node kind or edge type,
+    e.g. nodes/User/part-000000.parquet or edges/MemberOf/part-000003.csv.
+    The schema file maps each kind to its columns, each with its index in the CSV files and its type,
+    so the part files can be loaded with proper types. The progress is recorded in the checkpoint file
+    after each page, so an interrupted export can be resumed where it stopped.
+    """
+
+    def __init__(self, directory, file_format=None, resume=False):
+        """Start a new export into a directory or resume the export found in it."""
+
+        self.directory = directory
+        self._checkpoint_path = os.path.join(directory, CHECKPOINT_FILE)
+        if resume:
+            with open(self._checkpoint_path, "r", encoding="UTF-8") as f:
+                self.checkpoint = json.load(f)
+        else:
+            self.checkpoint = {
+                "format": file_format or default_format(),
+                "nodes": {"after_id": None, "parts": 0, "count": 0, "done": False},
+                "edges": {"after_id": None, "parts": 0, "count": 0, "done": False},
+                "schema": {"nodes": {}, "edges": {}},
+            }
+        self.format = self.checkpoint["format"]
+        if self.format == "parquet" and pyarrow is None:
+            raise ValueError("Writing Parquet files requires pyarrow to be installed.")
+
+
+    @classmethod
+    def exists(cls, directory):
+        """Return whether a directory contains an export."""
+
+        return os.path.exists(os.path.join(directory, CHECKPOINT_FILE))
+
+
+    def _save(self, name, data):
+        path = os.path.join(self.directory, name)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="UTF-8") as f:
+            json.dump(data, f, indent=4)
+        os.replace(tmp_path, path)
+
+
+    def _update_schema(self, section, kind, records):
+        """Add the columns of records to the schema and return all columns of the kind."""
+
+        columns = self.checkpoint["schema"][section].setdefault(kind, {})
+        for record in records:
+            for key, value in record.items():
+                if key not in columns:
+                    columns[key] = {"index": len(columns), "type": None}
+                if columns[key]["type"] is None and value is not None:
+                    columns[key]["type"] = _type_name(value)
+        return list(columns)
+
+
+    def _write_csv(self, path, columns, records):
+        with open(path, "w", encoding="UTF-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            for record in records:
+                writer.writerow([_csv_value(record.get(column)) for column in columns])
+
+
+    def _write_parquet(self, path, records):
+        try:
+            table = pyarrow.Table.from_pylist(records)
+        except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError):
+            # properties with mixed types are stored as JSON strings
+            table = pyarrow.Table.from_pylist([
+                {key: _csv_value(value) if value is not None else None for key, value in record.items()}
+                for record in records
+            ])
+        pyarrow.parquet.write_table(table, path)
+
+
+    def write_page(self, section, records_by_kind, count, **progress):
+        """Write a page of records grouped by kind to part files and record the progress.
+
+        section is either nodes or edges, count the number of records in the page
+        and progress the position to resume from after this page.
+        """
+
+        state = self.checkpoint[section]
+        for kind, records in records_by_kind.items():
+            columns = self._update_schema(section, kind, records)
+            kind_dir = os.path.join(self.directory, section, kind)
+            os.makedirs(kind_dir, exist_ok=True)
+            path = os.path.join(kind_dir, f"part-{state['parts']:06d}.{self.format}")
+            if self.format == "parquet":
+                self._write_parquet(path, records)
+            else:
+                self._write_csv(path, columns, records)
+        state["parts"] += 1
+        state["count"] += count
+        state.update(progress)
+        self._save(SCHEMA_FILE, self.checkpoint["schema"])
+        self._save(CHECKPOINT_FILE, self.checkpoint)
+
+
+    def finish(self, section):
+        """Mark a section as completely exported."""
+
+        self.checkpoint[section]["done"] = True
+        self._save(SCHEMA_FILE, self.checkpoint["schema"])
+        self._save(CHECKPOINT_FILE, self.checkpoint)
@@ -0,0 +1,240 @@
+import multiprocessing
+import os
+from array import array
+from collections import deque
+
+from bloodhound_cli import state
+from bloodhound_cli.graph import csr, strongly_connected_components
+from bloodhound_cli.logger import log
+
+
+CHUNK_SIZE = 64
+"""Number of start nodes whose reach is computed by a worker process in one task."""
+
+
+# condensed graph of components with their sizes and number of targets in a worker process, set by _init_worker
+_worker = None
+
+
+def _init_worker(offsets, neighbors, sizes, targets):
+    global _worker
+    _worker = (offsets, neighbors, sizes, targets, array("l", [-1]) * len(sizes))
+
+
+def _reach(starts):
+    """Return (start, reached nodes, reached targets) for each start component of the condensed graph.
+
+    The counts are sums over all other components reachable by breadth-first search. Components are marked
+    as visited with the number of the start component, so the marks never need to be reset.
+    """
+
+    offsets, neighbors, sizes, targets, visited = _worker
+    result = []
+    for start in starts:
+        visited[start] = start
+        queue = deque([start])
+        reached = 0
+        reached_targets = 0
+        while queue:
+            node = queue.popleft()
+            for neighbor in neighbors[offsets[node]:offsets[node + 1]]:
+                if visited[neighbor] != start:
+                    visited[neighbor] = start
+                    reached += sizes[neighbor]
+                    reached_targets += targets[neighbor]
+                    queue.append(neighbor)
+        result.append((start, reached, reached_targets))
+    return result
+
+
+class ExposureGraph:
+    """Graph of all relations between objects, held locally for reachability analyses.
+
+    The relations are stored in compressed sparse row format in both directions, i.e. as flat arrays
+    of neighbor numbers with an offset per node. Millions of relations fit into a few dozen megabytes
+    this way and can be handed to worker processes as a whole.
+    """
+
+    def __init__(self, nodes, relation_types, sources, types, targets, exclude_relations=()):
+        """Build the graph from nodes and relations.
+
+        nodes is a list of (sid, label, kind) tuples and relation_types a list of relation type names.
+        The relations are given as parallel sequences of source, type and target indices into these lists.
+        Relations of the types in exclude_relations are not followed.
+        """
+
+        self.nodes = nodes
+        self._index = {sid: i for i, (sid, _, _) in enumerate(nodes)}
+        excluded = {i for i, name in enumerate(relation_types) if name in exclude_relations}
+        if excluded:
+            kept = [t not in excluded for t in types]
+            sources = array("l", (s for s, keep in zip(sources, kept) if keep))
+            targets = array("l", (t for t, keep in zip(targets, kept) if keep))
+        self.num_relations = len(sources)
+        self._forward = csr(len(nodes), sources, targets)
+        self._reverse = csr(len(nodes), targets, sources)
+        self._condensation = None
+
+
+    def distances_to(self, target_sids):
+        """Return for each node the number of hops to the nearest target, or -1 if no target can be reached.
+
+        This is a breadth-first search from all targets at once, following the relations backwards.
+        """
+
+        offsets, neighbors = self._reverse
+        distances = array("l", [-1]) * len(self.nodes)
+        queue = deque()
+        for sid in target_sids:
+            node = self._index.get(sid)
+            if node is not None and distances[node] == -1:
+                distances[node] = 0
+                queue.append(node)
+        while queue:
+            node = queue.popleft()
+            for neighbor in neighbors[offsets[node]:offsets[node + 1]]:
+                if distances[neighbor] == -1:
+                    distances[neighbor] = distances[node] + 1
+                    queue.append(neighbor)
+        return distances
+
+
+    def _condensed(self):
+        """Return the component of each node and the relations between components as (offsets, neighbors) arrays.
+
+        All nodes of a strongly connected component reach the same nodes, so reachability is computed
+        once per component on this much smaller acyclic graph. Computed on first use and cached.
+        """
+
+        if self._condensation is None:
+            offsets, neighbors = self._forward
+            component, num_components = strongly_connected_components(len(self.nodes), offsets, neighbors)
+            relations = set()
+            for node in range(len(self.nodes)):
+                source = component[node]
+                for neighbor in neighbors[offsets[node]:offsets[node + 1]]:
+                    if component[neighbor] != source:
+                        relations.add((source, component[neighbor]))
+            sources = array("l", (source for source, _ in relations))
+            targets = array("l", (target for _, target in relations))
+            self._condensation = (component, *csr(num_components, sources, targets))
+            log.debug("Condensed %d objects into %d components", len(self.nodes), num_components)
+        return self._condensation
+
+
+    def reach(self, start_sids, target_sids, processes=None):
+        """Yield (sid, reached nodes, reached targets) for each start node, in no particular order.
+
+        The counts are computed by a breadth-first search per strongly connected component of the start nodes,
+        distributed over a pool of processes (one per CPU by default).
+        """
+
+        component, offsets, neighbors = self._condensed()
+        sizes = array("l", [0]) * (len(offsets) - 1)
+        targets = array("l", [0]) * (len(offsets) - 1)
+        for node in range(len(self.nodes)):
+            sizes[component[node]] += 1
+        is_target = set()
+        for sid in target_sids:
+            if sid in self._index:
+                is_target.add(self._index[sid])
+                targets[component[self._index[sid]]] += 1
+
+        starts = [self._index[sid] for sid in start_sids if sid in self._index]
+        start_components = sorted({component[start] for start in starts})
+        chunks = [start_components[i:i + CHUNK_SIZE] for i in range(0, len(start_components), CHUNK_SIZE)]
+        initargs = (offsets, neighbors, sizes, targets)
+
+        processes = min(processes or os.cpu_count() or 1, len(chunks))
+        if processes <= 1:
+            _init_worker(*initargs)
+            results = list(map(_reach, chunks))
+        else:
+            with multiprocessing.Pool(processes, initializer=_init_worker, initargs=initargs) as pool:
+                results = list(pool.imap_unordered(_reach, chunks))
+        reach = {c: (reached, reached_targets) for chunk in results for c, reached, reached_targets in chunk}
+
+        # the other nodes of the start node's own component are reachable as well
+        for start in starts:
+            c = component[start]
+            reached, reached_targets = reach[c]
+            yield (
+                self.nodes[start][0],
+                reached + sizes[c] - 1,
+                reached_targets + targets[c] - (start in is_target),
+            )
+
+
+    def __contains__(self, sid):
+        return sid in self._index
+
+
+    def label(self, sid):
+        """Return the label of a node."""
+
+        return self.nodes[self._index[sid]][1]
+
+
+    def kind(self, sid):
+        """Return the kind of a node."""
+
+        return self.nodes[self._index[sid]][2]
+
+
+    @classmethod
+    def fetch(cls, api, exclude_relations=(), page_size=1000):
+        """Return the graph for the data on the API server.
+
+        The relations are fetched only once per ingest, they are stored locally and reused
+        until another file upload job completes. The node table is stored as JSON,
+        the relations as compact binary arrays of source, type and target indices.
+        """
+
+        last_ingest = api.last_ingest()
+        cached = state.load("exposure", api.url)
+        if cached is not None and last_ingest is not None and cached.get("ingest") == last_ingest:
+            arrays = state.load_arrays("exposure", api.url)
+            if arrays is not None and len(arrays["sources"]) == cached["relations"]:
+                log.debug("Using stored relations")
+                return cls(
+                    [tuple(n) for n in cached["nodes"]], cached["types"],
+                    arrays["sources"], arrays["types"], arrays["targets"], exclude_relations,
+                )
+
+        log.info("Fetching all relations...")
+        nodes = []
+        index = {}
+        types = []
+        type_index = {}
+        sources = array("i")
+        relation_types = array("H")
+        targets = array("i")
+        for page in api.iter_edges(include_properties=False, page_size=page_size):
+            for source, edge, target in page:
+                relation = edge["label"]
+                if relation not in type_index:
+                    type_index[relation] = len(types)
+                    types.append(relation)
+                ids = []
+                for node in (source, target):
+                    sid = node["objectId"]
+                    if sid not in index:
+                        index[sid] = len(nodes)
+                        nodes.append((sid, node["label"], node["kind"]))
+                    ids.append(index[sid])
+                sources.append(ids[0])
+                relation_types.append(type_index[relation])
+                targets.append(ids[1])
+            log.debug("Fetched %d relations", len(sources))
+        log.info("Fetched %d relations between %d objects.", len(sources), len(nodes))
+
+        if last_ingest is not None:
+            # the arrays first, so the JSON state never refers to missing or older arrays
+            state.save_arrays("exposure", api.url, {"sources": sources, "types": relation_types, "targets": targets})
+            state.save("exposure", api.url, {
+                "ingest": last_ingest,
+                "nodes": nodes,
+                "types": types,
+                "relations": len(sources),
+            })
+        return cls(nodes, types, sources, relation_types, targets, exclude_relations)
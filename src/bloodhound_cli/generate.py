@@ -0,0 +1,353 @@
+import io
+import json
+import os
+import random
+import time
+import zipfile
+
+from bloodhound_cli.constants import RID
+
+
+FIRST_RID = 1000
+"""RID of the first generated (non well-known) object."""
+
+RIGHTS = [
+    "GenericAll",
+    "GenericWrite",
+    "WriteDacl",
+    "WriteOwner",
+    "Owns",
+    "AllExtendedRights",
+    "ForceChangePassword",
+    "AddMember",
+]
+"""Rights randomly assigned in generated ACEs."""
+
+OPERATING_SYSTEMS = [
+    "WINDOWS 10 ENTERPRISE",
+    "WINDOWS 11 ENTERPRISE",
+    "WINDOWS SERVER 2016 STANDARD",
+    "WINDOWS SERVER 2019 STANDARD",
+    "WINDOWS SERVER 2022 DATACENTER",
+    "WINDOWS SERVER 2012 R2 DATACENTER",
+    "WINDOWS 7 PROFESSIONAL",
+]
+"""Operating systems randomly assigned to generated computers."""
+
+
+class Dataset:
+    """Seedable generator for a synthetic domain in the SharpHound collector format.
+
+    Objects are produced one at a time and written as a stream,
+    so memory consumption does not depend on the size of the dataset.
+    Identical parameters and seed always produce identical data.
+    """
+
+    def __init__(self, domain="CONTOSO.COM", principals=10000, seed=0, memberships=3, acl_density=0.05):
+        """Create a dataset of a given number of principals (70% users, 20% computers, 10% groups).
+
+        memberships is the average number of groups a user or computer is member of
+        and acl_density the probability of an object having an additional random ACE.
+        """
+
+        self.seed = seed
+        self.domain = domain.upper()
+        self.num_users = max(int(principals * 0.7), 1)
+        self.num_computers = max(int(principals * 0.2), 1)
+        self.num_groups = max(principals - self.num_users - self.num_computers, 1)
+        self.memberships = memberships
+        self.acl_density = acl_density
+
+        rng = self._rng("domain")
+        self.domainsid = "S-1-5-21-" + "-".join(str(rng.randrange(10**9, 4 * 10**9)) for _ in range(3))
+        self.domain_dn = ",".join(f"DC={part}" for part in self.domain.split("."))
+
+
+    def _rng(self, purpose):
+        """Return a random number generator for a given purpose, derived from the seed."""
+
+        return random.Random(f"{self.seed}:{self.domain}:{purpose}")
+
+
+    def _sid(self, rid):
+        """Return the SID of an object in the generated domain."""
+
+        return f"{self.domainsid}-{rid}"
+
+
+    def _user_rid(self, i):
+        return FIRST_RID + i
+
+
+    def _computer_rid(self, i):
+        return FIRST_RID + self.num_users + i
+
+
+    def _group_rid(self, i):
+        return FIRST_RID + self.num_users + self.num_computers + i
+
+
+    def _random_principal(self, rng):
+        """Return SID and type of a random generated user or group."""
+
+        i = rng.randrange(self.num_users + self.num_groups)
+        if i < self.num_users:
+            return self._sid(self._user_rid(i)), "User"
+        return self._sid(self._group_rid(i - self.num_users)), "Group"
+
+
+    def _aces(self, rng, rights=None):
+        """Return the ACEs of an object, i.e. GenericAll for Domain Admins plus random additional ones."""
+
+        aces = [{
+            "PrincipalSID": self._sid(RID.DOMAIN_ADMINS),
+            "PrincipalType": "Group",
+            "RightName": "GenericAll",
+            "IsInherited": True,
+        }]
+        while rng.random() < self.acl_density:
+            sid, kind = self._random_principal(rng)
+            aces.append({
+                "PrincipalSID": sid,
+                "PrincipalType": kind,
+                "RightName": rng.choice(rights or RIGHTS[:-1]),
+                "IsInherited": False,
+            })
+        return aces
+
+
+    def _common_properties(self, name, rid, rng):
+        return {
+            "domain": self.domain,
+            "domainsid": self.domainsid,
+            "name": name,
+            "distinguishedname": f"CN={name.split('@')[0].split('.')[0]},CN=Users,{self.domain_dn}",
+            "whencreated": 1262304000 + rng.randrange(15 * 365 * 86400),
+            "isaclprotected": False,
+            "description": None,
+            "rid": rid,
+        }
+
+
+    def _user(self, rid, sam, rng, **overrides):
+        name = f"{sam.upper()}@{self.domain}"
+        props = self._common_properties(name, rid, rng)
+        hasspn = rng.random() < 0.02
+        props.update({
+            "samaccountname": sam,
+            "displayname": sam.capitalize(),
+            "enabled": rng.random() < 0.9,
+            "hasspn": hasspn,
+            "serviceprincipalnames": [f"MSSQLSvc/{sam}.{self.domain.lower()}:1433"] if hasspn else [],
+            "dontreqpreauth": rng.random() < 0.005,
+            "unconstraineddelegation": False,
+            "admincount": False,
+            "pwdlastset": 1577836800 + rng.randrange(5 * 365 * 86400),
+            "lastlogon": 1672531200 + rng.randrange(365 * 86400),
+        })
+        if rng.random() < 0.1:
+            props["description"] = f"Synthetic user account {sam}"
+        props.update(overrides)
+        return {
+            "ObjectIdentifier": self._sid(rid),
+            "Properties": props,
+            "Aces": self._aces(rng),
+            "AllowedToDelegate": [],
+            "SPNTargets": [],
+            "HasSIDHistory": [],
+            "PrimaryGroupSID": self._sid(RID.DOMAIN_USERS),
+            "IsDeleted": False,
+            "IsACLProtected": False,
+        }
+
+
+    def users(self):
+        """Yield all user objects."""
+
+        rng = self._rng("users")
+        yield self._user(500, "administrator", rng, enabled=True, admincount=True)
+        yield self._user(RID.GUEST, "guest", rng, enabled=False)
+        for i in range(self.num_users):
+            yield self._user(self._user_rid(i), f"user{i:07d}", rng)
+
+
+    def computers(self):
+        """Yield all computer objects, the first ones being domain controllers."""
+
+        rng = self._rng("computers")
+        for i in range(self.num_computers):
+            rid = self._computer_rid(i)
+            is_dc = i < self._num_dcs()
+            host = f"DC{i:02d}" if is_dc else f"HOST{i:07d}"
+            props = self._common_properties(f"{host}.{self.domain}", rid, rng)
+            props.update({
+                "samaccountname": f"{host}$",
+                "enabled": is_dc or rng.random() < 0.95,
+                "operatingsystem": OPERATING_SYSTEMS[4] if is_dc else rng.choice(OPERATING_SYSTEMS),
+                "unconstraineddelegation": is_dc or rng.random() < 0.01,
+                "haslaps": rng.random() < 0.5,
+                "lastlogontimestamp": 1672531200 + rng.randrange(365 * 86400),
+            })
+            yield {
+                "ObjectIdentifier": self._sid(rid),
+                "Properties": props,
+                "Aces": self._aces(rng),
+                "PrimaryGroupSID": self._sid(RID.DOMAIN_CONTROLLERS if is_dc else RID.DOMAIN_COMPUTERS),
+                "AllowedToDelegate": [],
+                "AllowedToAct": [],
+                "HasSIDHistory": [],
+                "DumpSMSAPassword": [],
+                "Sessions": {"Results": [], "Collected": False, "FailureReason": None},
+                "PrivilegedSessions": {"Results": [], "Collected": False, "FailureReason": None},
+                "RegistrySessions": {"Results": [], "Collected": False, "FailureReason": None},
+                "LocalGroups": [],
+                "UserRights": [],
+                "DomainSID": self.domainsid,
+                "Status": None,
+                "IsDeleted": False,
+                "IsACLProtected": False,
+            }
+
+
+    def _num_dcs(self):
+        return min(max(self.num_computers // 1000, 1), self.num_computers)
+
+
+    def _group(self, rid, name, members, rng):
+        props = self._common_properties(f"{name}@{self.domain}", rid, rng)
+        props.update({
+            "samaccountname": name.lower(),
+            "admincount": rid < FIRST_RID,
+        })
+        return {
+            "ObjectIdentifier": self._sid(rid),
+            "Properties": props,
+            "Members": members,
+            "Aces": self._aces(rng, RIGHTS),
+            "IsDeleted": False,
+            "IsACLProtected": False,
+        }
+
+
+    def groups(self):
+        """Yield all group objects.
+
+        Besides some well-known groups, generated groups have random members,
+        including nested groups with a higher index, which leads to deep nesting chains.
+        """
+
+        rng = self._rng("groups")
+        admins = [
+            {"ObjectIdentifier": self._sid(500), "ObjectType": "User"},
+        ] + [
+            {"ObjectIdentifier": self._sid(self._user_rid(rng.randrange(self.num_users))), "ObjectType": "User"}
+            for _ in range(rng.randint(1, 5))
+        ]
+        yield self._group(RID.DOMAIN_ADMINS, "DOMAIN ADMINS", admins, rng)
+        yield self._group(RID.DOMAIN_USERS, "DOMAIN USERS", [], rng)
+        yield self._group(RID.DOMAIN_COMPUTERS, "DOMAIN COMPUTERS", [], rng)
+        yield self._group(RID.DOMAIN_CONTROLLERS, "DOMAIN CONTROLLERS", [], rng)
+        yield self._group(RID.PROTECTED_USERS, "PROTECTED USERS", [], rng)
+
+        average_size = (self.num_users + self.num_computers) * self.memberships / self.num_groups
+        for i in range(self.num_groups):
+            members = []
+            for _ in range(rng.randint(0, int(2 * average_size))):
+                j = rng.randrange(self.num_users + self.num_computers)
+                if j < self.num_users:
+                    members.append({"ObjectIdentifier": self._sid(self._user_rid(j)), "ObjectType": "User"})
+                else:
+                    members.append({"ObjectIdentifier": self._sid(self._computer_rid(j - self.num_users)), "ObjectType": "Computer"})
+            if i + 1 < self.num_groups:
+                for _ in range(rng.randint(0, 2)):
+                    j = rng.randrange(i + 1, self.num_groups)
+                    members.append({"ObjectIdentifier": self._sid(self._group_rid(j)), "ObjectType": "Group"})
+            yield self._group(self._group_rid(i), f"GROUP{i:07d}", members, rng)
+
+
+    def domains(self):
+        """Yield the domain object."""
+
+        rng = self._rng("domains")
+        props = self._common_properties(self.domain, None, rng)
+        props.update({
+            "distinguishedname": self.domain_dn,
+            "functionallevel": "2016",
+        })
+        del props["rid"]
+        yield {
+            "ObjectIdentifier": self.domainsid,
+            "Properties": props,
+            "Aces": self._aces(rng),
+            "Trusts": [],
+            "Links": [],
+            "ChildObjects": [],
+            "GPOChanges": {
+                "LocalAdmins": [],
+                "RemoteDesktopUsers": [],
+                "DcomUsers": [],
+                "PSRemoteUsers": [],
+                "AffectedComputers": [],
+            },
+            "IsDeleted": False,
+            "IsACLProtected": False,
+        }
+
+
+    def counts(self):
+        """Return the number of objects per data type."""
+
+        return {
+            "users": self.num_users + 2,
+            "computers": self.num_computers,
+            "groups": self.num_groups + 5,
+            "domains": 1,
+        }
+
+
+    def write(self, data_type, f):
+        """Write all objects of a data type as a collector JSON document to a text stream."""
+
+        f.write('{"data": [\n')
+        for i, obj in enumerate(getattr(self, data_type)()):
+            if i:
+                f.write(",\n")
+            f.write(json.dumps(obj, separators=(",", ":")))
+        meta = {
+            "methods": 0,
+            "type": data_type,
+            "count": self.counts()[data_type],
+            "version": 5,
+        }
+        f.write(f'\n], "meta": {json.dumps(meta)}}}\n')
+
+
+def write_files(dataset, directory, compress=False, prefix=None):
+    """Write the collector files of a dataset to a directory and return their paths.
+
+    If compress is set, the files are bundled into a single ZIP file, like SharpHound does by default.
+    """
+
+    if prefix is None:
+        prefix = time.strftime("%Y%m%d%H%M%S")
+    os.makedirs(directory, exist_ok=True)
+    data_types = list(dataset.counts())
+
+    if compress:
+        path = os.path.join(directory, f"{prefix}_BloodHound.zip")
+        with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            for data_type in data_types:
+                info = zipfile.ZipInfo(f"{prefix}_{data_type}.json", date_time=time.localtime()[:6])
+                info.compress_type = zipfile.ZIP_DEFLATED
+                with zf.open(info, "w", force_zip64=True) as raw:
+                    with io.TextIOWrapper(raw, encoding="UTF-8") as f:
+                        dataset.write(data_type, f)
+        return [path]
+
+    paths = []
+    for data_type in data_types:
+        path = os.path.join(directory, f"{prefix}_{data_type}.json")
+        with open(path, "w", encoding="UTF-8") as f:
+            dataset.write(data_type, f)
+        paths.append(path)
+    return paths
@@ -0,0 +1,80 @@
+from array import array
+
+
+def csr(num_nodes, sources, targets):
+    """Return the adjacency of a graph in compressed sparse row format as (offsets, neighbors) arrays.
+
+    The neighbors of node i are neighbors[offsets[i]:offsets[i + 1]].
+    """
+
+    offsets = array("l", [0]) * (num_nodes + 1)
+    for source in sources:
+        offsets[source + 1] += 1
+    for i in range(num_nodes):
+        offsets[i + 1] += offsets[i]
+    position = offsets[:-1]
+    neighbors = array("l", [0]) * len(sources)
+    for source, target in zip(sources, targets):
+        neighbors[position[source]] = target
+        position[source] += 1
+    return offsets, neighbors
+
+
+def strongly_connected_components(num_nodes, offsets, neighbors):
+    """Return the strongly connected component of each node and the number of components.
+
+    Uses an iterative version of Tarjan's algorithm, which numbers the components in reverse
+    topological order, i.e. relations only lead to components with lower numbers.
+    """
+
+    index = array("l", [-1]) * num_nodes
+    lowlink = array("l", [0]) * num_nodes
+    on_stack = bytearray(num_nodes)
+    component = array("l", [-1]) * num_nodes
+    stack = []
+    counter = 0
+    num_components = 0
+
+    for root in range(num_nodes):
+        if index[root] != -1:
+            continue
+        index[root] = lowlink[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = 1
+        work = [(root, offsets[root])]
+        while work:
+            node, position = work[-1]
+            end = offsets[node + 1]
+            descended = False
+            while position < end:
+                child = neighbors[position]
+                position += 1
+                if index[child] == -1:
+                    work[-1] = (node, position)
+                    index[child] = lowlink[child] = counter
+                    counter += 1
+                    stack.append(child)
+                    on_stack[child] = 1
+                    work.append((child, offsets[child]))
+                    descended = True
+                    break
+                if on_stack[child] and index[child] < lowlink[node]:
+                    lowlink[node] = index[child]
+            if descended:
+                continue
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                if lowlink[node] < lowlink[parent]:
+                    lowlink[parent] = lowlink[node]
+            if lowlink[node] == index[node]:
+                while True:
+                    member = stack.pop()
+                    on_stack[member] = 0
+                    component[member] = num_components
+                    if member == node:
+                        break
+                num_components += 1
+
+    return component, num_components
@@ -0,0 +1,99 @@
+import os
+import sqlite3
+import time
+
+from bloodhound_cli import state
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS stats (
+    domainsid TEXT NOT NULL,
+    domain TEXT NOT NULL,
+    ingest TEXT NOT NULL,
+    recorded INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    statistic TEXT NOT NULL,
+    num_all INTEGER NOT NULL,
+    num_enabled INTEGER,
+    PRIMARY KEY (domainsid, ingest, statistic)
+) WITHOUT ROWID
+"""
+
+
+class StatsHistory:
+    """Time series of domain statistics, stored locally in an SQLite database per server.
+
+    Each sample holds the statistics of a domain for one ingest, identified by the end time
+    of the last completed file upload job. Recording the same ingest again has no effect.
+    """
+
+    def __init__(self, url):
+        path = state.state_file("stats", url, extension=".sqlite")
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        self._db = sqlite3.connect(path)
+        with self._db:
+            self._db.execute(SCHEMA)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+    def close(self):
+        self._db.close()
+
+
+    def recorded(self, domsid, ingest):
+        """Return the statistics recorded for a domain and ingest as list of (statistic, all, enabled) tuples.
+
+        The list is empty if there is no such sample.
+        """
+
+        cursor = self._db.execute(
+            "SELECT statistic, num_all, num_enabled FROM stats WHERE domainsid = ? AND ingest = ? ORDER BY position",
+            (domsid, ingest),
+        )
+        return cursor.fetchall()
+
+
+    def record(self, dom, domsid, ingest, rows):
+        """Store the statistics of a domain for an ingest, given as (statistic, all, enabled) tuples."""
+
+        recorded = int(time.time())
+        with self._db:
+            self._db.executemany(
+                "INSERT OR IGNORE INTO stats VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(domsid, dom, ingest, recorded, position, *row) for position, row in enumerate(rows)],
+            )
+
+
+    def samples(self, domain=None, last=None):
+        """Return the recorded samples per domain as list of (domain, SID, samples) tuples.
+
+        samples is a list of (ingest, rows) tuples, oldest first, with rows like returned by recorded().
+        domain selects a single domain by name or SID, last limits the samples to the most recent ones.
+        """
+
+        query = "SELECT domainsid, domain, ingest, statistic, num_all, num_enabled FROM stats"
+        params = ()
+        if domain is not None:
+            query += " WHERE upper(domain) = upper(?) OR upper(domainsid) = upper(?)"
+            params = (domain, domain)
+        query += " ORDER BY domain, domainsid, ingest, position"
+
+        result = []
+        for domsid, dom, ingest, statistic, num_all, num_enabled in self._db.execute(query, params):
+            if not result or result[-1][1] != domsid:
+                result.append((dom, domsid, []))
+            samples = result[-1][2]
+            if not samples or samples[-1][0] != ingest:
+                samples.append((ingest, []))
+            samples[-1][1].append((statistic, num_all, num_enabled))
+
+        if last is not None:
+            result = [(dom, domsid, samples[-last:]) for dom, domsid, samples in result]
+        return result
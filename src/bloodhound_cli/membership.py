@@ -0,0 +1,199 @@
+from array import array
+
+from bloodhound_cli import state
+from bloodhound_cli.graph import csr, strongly_connected_components
+from bloodhound_cli.logger import log
+
+
+class MembershipIndex:
+    """Transitive closure of group memberships, computed locally from the MemberOf relations.
+
+    Groups nested into each other in cycles are condensed into strongly connected components first.
+    For each component, the nested groups and the groups it is nested into are then computed
+    as bitsets over all groups, lazily on first use and cached afterwards.
+    """
+
+    def __init__(self, principals, memberships):
+        """Build the index from principals and direct memberships.
+
+        principals is a list of (sid, label, kind) tuples and memberships a list of
+        (member, group) tuples of indices into the principals list.
+        """
+
+        self.principals = principals
+        self._index = {sid: i for i, (sid, _, _) in enumerate(principals)}
+        self._members = [[] for _ in principals]
+        self._groups = [[] for _ in principals]
+        for member, group in memberships:
+            self._members[group].append(member)
+            self._groups[member].append(group)
+
+        # groups are numbered separately, bitsets only cover groups and not all principals
+        self._group_principals = [p for p in range(len(principals)) if self._members[p] or principals[p][2] == "Group"]
+        self._group_number = {p: g for g, p in enumerate(self._group_principals)}
+        self._nested = [
+            [self._group_number[m] for m in self._members[p] if m in self._group_number]
+            for p in self._group_principals
+        ]
+        self._nested_into = [
+            [self._group_number[g] for g in self._groups[p]]
+            for p in self._group_principals
+        ]
+        self._component = self._strongly_connected_components()
+        self._nested_bits = {}
+        self._nested_into_bits = {}
+
+
+    def _strongly_connected_components(self):
+        """Return the component number of each group, computed on the graph of nested groups."""
+
+        sources = array("l", (group for group, nested in enumerate(self._nested) for _ in nested))
+        targets = array("l", (member for nested in self._nested for member in nested))
+        offsets, neighbors = csr(len(self._nested), sources, targets)
+        component, num_components = strongly_connected_components(len(self._nested), offsets, neighbors)
+
+        self._component_groups = [[] for _ in range(num_components)]
+        for group, comp in enumerate(component):
+            self._component_groups[comp].append(group)
+        return component
+
+
+    def _closure(self, start, neighbors, cache):
+        """Return the bitset of all groups reachable from a component via the neighbors lists.
+
+        Components are visited in post-order without recursion and all intermediate results are cached.
+        """
+
+        work = [start]
+        while work:
+            comp = work[-1]
+            if comp in cache:
+                work.pop()
+                continue
+            pending = [
+                self._component[n]
+                for g in self._component_groups[comp]
+                for n in neighbors[g]
+                if self._component[n] != comp and self._component[n] not in cache
+            ]
+            if pending:
+                work.extend(pending)
+                continue
+            work.pop()
+            groups = self._component_groups[comp]
+            bits = 0
+            if len(groups) > 1 or any(g in neighbors[g] for g in groups):
+                # nested in a cycle, the groups are nested into themselves
+                for g in groups:
+                    bits |= 1 << g
+            for n in {n for g in groups for n in neighbors[g]}:
+                bits |= 1 << n
+            for c in {self._component[n] for g in groups for n in neighbors[g]} - {comp}:
+                bits |= cache[c]
+            cache[comp] = bits
+        return cache[start]
+
+
+    @staticmethod
+    def _bit_positions(bits):
+        """Yield the positions of all set bits."""
+
+        binary = bin(bits)[:1:-1]
+        i = binary.find("1")
+        while i != -1:
+            yield i
+            i = binary.find("1", i + 1)
+
+
+    def members(self, group_sid, indirect=True):
+        """Return the sids of the members of a group (includes indirect members by default)."""
+
+        group = self._index.get(group_sid)
+        if group is None or group not in self._group_number:
+            return []
+        if not indirect:
+            return [self.principals[m][0] for m in self._members[group]]
+        number = self._group_number[group]
+        nested = self._closure(self._component[number], self._nested, self._nested_bits) | (1 << number)
+        members = set()
+        for g in self._bit_positions(nested):
+            members.update(self._members[self._group_principals[g]])
+        members.discard(group)
+        return [self.principals[m][0] for m in members]
+
+
+    def groups(self, principal_sid, indirect=True):
+        """Return the sids of the groups a principal is member of (includes indirect memberships by default)."""
+
+        principal = self._index.get(principal_sid)
+        if principal is None:
+            return []
+        if not indirect:
+            return [self.principals[g][0] for g in self._groups[principal]]
+        if principal in self._group_number:
+            bits = self._closure(self._component[self._group_number[principal]], self._nested_into, self._nested_into_bits)
+        else:
+            bits = 0
+            for g in self._groups[principal]:
+                number = self._group_number[g]
+                bits |= (1 << number) | self._closure(self._component[number], self._nested_into, self._nested_into_bits)
+        return [
+            self.principals[self._group_principals[g]][0]
+            for g in self._bit_positions(bits)
+            if self._group_principals[g] != principal
+        ]
+
+
+    def label(self, sid):
+        """Return the label of a principal."""
+
+        return self.principals[self._index[sid]][1]
+
+
+    def kind(self, sid):
+        """Return the kind of a principal."""
+
+        return self.principals[self._index[sid]][2]
+
+
+    @classmethod
+    def fetch(cls, api):
+        """Return the index for the data on the API server.
+
+        The relations are fetched only once per ingest, the index is stored locally and reused
+        until another file upload job completes.
+        """
+
+        last_ingest = api.last_ingest()
+        cached = state.load("membership", api.url)
+        if cached is not None and last_ingest is not None and cached.get("ingest") == last_ingest:
+            log.debug("Using stored group membership index")
+            memberships = cached["memberships"]
+            return cls(
+                [tuple(p) for p in cached["principals"]],
+                list(zip(memberships[::2], memberships[1::2])),
+            )
+
+        log.info("Building group membership index...")
+        principals = []
+        index = {}
+        memberships = []
+        for page in api.iter_edges(["MemberOf"], include_properties=False):
+            for member, _, group in page:
+                ids = []
+                for node in (member, group):
+                    sid = node["objectId"]
+                    if sid not in index:
+                        index[sid] = len(principals)
+                        principals.append((sid, node["label"], node["kind"]))
+                    ids.append(index[sid])
+                memberships.append(tuple(ids))
+        log.info("Indexed %d memberships of %d principals.", len(memberships), len(principals))
+
+        if last_ingest is not None:
+            state.save("membership", api.url, {
+                "ingest": last_ingest,
+                "principals": principals,
+                "memberships": [i for membership in memberships for i in membership],
+            })
+        return cls(principals, memberships)
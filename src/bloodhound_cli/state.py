@@ -0,0 +1,84 @@
+import hashlib
+import json
+import os
+import struct
+from array import array
+
+from bloodhound_cli.logger import log
+
+
+def state_dir():
+    """Return the directory for persistent state of the tool, respecting $XDG_STATE_HOME."""
+
+    state_home = os.environ.get("XDG_STATE_HOME", default=os.path.join(os.path.expanduser("~"), ".local", "state"))
+    return os.path.join(state_home, "bhcli")
+
+
+def state_file(name, url, extension=".json"):
+    """Return the path of a state file for a given purpose, scoped to the API server at url."""
+
+    server = hashlib.sha256(url.encode()).hexdigest()[:16]
+    return os.path.join(state_dir(), f"{name}-{server}{extension}")
+
+
+def load(name, url, default=None):
+    """Load JSON state for a given purpose and server, returning default if there is none."""
+
+    path = state_file(name, url)
+    try:
+        with open(path, "r", encoding="UTF-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+    except (OSError, ValueError) as e:
+        log.warning("Ignoring unreadable state file %s: %s", path, e)
+        return default
+
+
+def save(name, url, data):
+    """Atomically save JSON state for a given purpose and server."""
+
+    path = state_file(name, url)
+    os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="UTF-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def save_arrays(name, url, arrays):
+    """Atomically save named arrays (array.array) in a compact binary state file for a given purpose and server.
+
+    The file starts with a JSON header listing the type code and length of each array, followed by their raw bytes.
+    """
+
+    path = state_file(name, url, extension=".bin")
+    os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+    header = json.dumps({key: [values.typecode, len(values)] for key, values in arrays.items()}).encode()
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(struct.pack("<I", len(header)))
+        f.write(header)
+        for values in arrays.values():
+            values.tofile(f)
+    os.replace(tmp_path, path)
+
+
+def load_arrays(name, url):
+    """Load named arrays saved by save_arrays, returning None if there are none."""
+
+    path = state_file(name, url, extension=".bin")
+    try:
+        with open(path, "rb") as f:
+            (header_size,) = struct.unpack("<I", f.read(4))
+            header = json.loads(f.read(header_size))
+            arrays = {}
+            for key, (typecode, length) in header.items():
+                arrays[key] = array(typecode)
+                arrays[key].fromfile(f, length)
+            return arrays
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, EOFError, struct.error) as e:
+        log.warning("Ignoring unreadable state file %s: %s", path, e)
+        return None